@@ -22,6 +22,11 @@ FTP_PORT = 21
 MAX_CONTENT_LENGTH = 512 * 1024 * 1024
 MIN_PWD_LEN = 10
 MAX_PWD_LEN = 500
+# Must be shared between the gunicorn workers, e.g. FileSystemCache or RedisCache
+CACHE_TYPE = 'FileSystemCache'
+# Folder of the FileSystemCache, which only the platform should be able to write to. Defaults to cache/ in the
+# installation folder.
+CACHE_DIR = '/path/to/installation/cache'
 
 
 # GCP SPECIFIC CONFIG
@@ -26,6 +26,14 @@ class DeclarativeABCMeta(DeclarativeMeta, ABCMeta):
 Base = declarative_base(metaclass=DeclarativeMeta)
 Base.query = None
 db_engine = None
+db_engine_uri = None
+
+# Connection pool settings for server databases (SQLite manages its own connections)
+DB_POOL_SIZE = 10
+DB_POOL_MAX_OVERFLOW = 10
+DB_POOL_RECYCLE = 1800  # In seconds, well below the default MySQL wait_timeout
+# Number of compiled SQL statements kept per engine, so repeated queries skip compilation
+DB_QUERY_CACHE_SIZE = 1200
 
 
 def create_session(db_string: str, drop_tables: bool = False) -> scoped_session:
@@ -39,13 +47,20 @@ def create_session(db_string: str, drop_tables: bool = False) -> scoped_session:
     :return: A SQLAlchemy session object
     :rtype: sqlalchemy.orm.scoped_session
     """
-    import os
-    global db_engine, Base
+    global db_engine, db_engine_uri, Base
 
     try:
-        # In testing, we want to maintain same memory variable
-        if db_engine is None or 'TESTING' not in os.environ or os.environ['TESTING'] == 'False':
-            db_engine = create_engine(db_string, convert_unicode=True)
+        # Reuse the engine, and with it the pool of open connections, for as long as the database doesn't change. In
+        # testing, this also keeps the same in-memory database alive.
+        if db_engine is None or db_engine_uri != db_string:
+            engine_options: Dict[str, Any] = {
+                'convert_unicode': True, 'pool_pre_ping': True, 'query_cache_size': DB_QUERY_CACHE_SIZE
+            }
+            if not db_string.startswith('sqlite'):
+                engine_options.update(
+                    pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW, pool_recycle=DB_POOL_RECYCLE)
+            db_engine = create_engine(db_string, **engine_options)
+            db_engine_uri = db_string
         db_session = scoped_session(sessionmaker(bind=db_engine))
         Base.query = db_session.query_property()
 
@@ -163,6 +178,9 @@ class DeclEnum(object, metaclass=EnumMeta):
 class DeclEnumType(SchemaType, TypeDecorator):
     """Declarative enumeration type."""
 
+    # The only state is the enum class, so statements using this type can be cached by SQLAlchemy
+    cache_ok = True
+
     def __init__(self, enum: Any) -> None:
         self.enum = enum
         self.impl = Enum(
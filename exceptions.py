@@ -78,3 +78,11 @@ class CCExtractorEndedWithNonZero(Exception):
     def __init__(self) -> None:
         Exception.__init__(self)
         sys.exit(1)
+
+
+class InvalidNumberOfJobs(Exception):
+    """Custom exception handler for handling an invalid number of CCExtractor runs with update sample method."""
+
+    def __init__(self) -> None:
+        Exception.__init__(self)
+        sys.exit(1)
@@ -2,7 +2,8 @@
 """Root module to manage flask script commands."""
 from flask_script import Command, Manager
 
-from exceptions import CCExtractorEndedWithNonZero, MissingPathToCCExtractor
+from exceptions import (CCExtractorEndedWithNonZero, InvalidNumberOfJobs,
+                        MissingPathToCCExtractor)
 from mod_regression.update_regression import update_expected_results
 from run import app
 
@@ -15,6 +16,8 @@ class UpdateResults(Command):
     Update results for the present samples with new ccextractor version.
 
     Pass path to CCExtractor binary as the first argument. Example, `python manage.py update /path/to/ccextractor`
+    The number of CCExtractor runs at the same time can be passed as the second argument, it defaults to the number of
+    CPUs. Example, `python manage.py update /path/to/ccextractor 4`
     """
 
     name = 'update'
@@ -28,8 +31,18 @@ class UpdateResults(Command):
 
         path_to_ccex = remaining[0]
         print(f'path to ccextractor: {path_to_ccex}')
-
-        if not update_expected_results(path_to_ccex):
+        jobs = None
+        if len(remaining) > 1:
+            try:
+                jobs = int(remaining[1])
+            except ValueError:
+                jobs = 0
+            if jobs < 1:
+                print('number of jobs must be a positive integer')
+                print('usage: python manage.py update /path/to/ccextractor [jobs]')
+                raise InvalidNumberOfJobs
+
+        if not update_expected_results(path_to_ccex, jobs):
             print('update function errored')
             raise CCExtractorEndedWithNonZero
 
@@ -0,0 +1,24 @@
+"""Add covering index for latest CCExtractor release lookup
+
+Revision ID: c8f3e4a7d2b1
+Revises: b3ed927671bd
+Create Date: 2026-10-18 08:52:13.402118
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c8f3e4a7d2b1'
+down_revision = 'b3ed927671bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_ccextractor_version_released_desc', 'ccextractor_version',
+                    [sa.text('released DESC'), 'commit', 'version'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ccextractor_version_released_desc', table_name='ccextractor_version')
@@ -0,0 +1,27 @@
+"""Add covering index for the tests of a category
+
+Revision ID: d41a9b6e53c0
+Revises: c8f3e4a7d2b1
+Create Date: 2026-10-18 11:37:48.215904
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd41a9b6e53c0'
+down_revision = 'c8f3e4a7d2b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_regression_test_category_category_id_regression_id', 'regression_test_category',
+                    ['category_id', 'regression_id'], unique=False)
+
+
+def downgrade():
+    # MySQL drops the implicit foreign key index on category_id once the composite index covers it, and won't drop the
+    # composite index while the foreign key needs it
+    op.create_index('ix_regression_test_category_category_id', 'regression_test_category', ['category_id'],
+                    unique=False)
+    op.drop_index('ix_regression_test_category_category_id_regression_id', table_name='regression_test_category')
@@ -0,0 +1,40 @@
+"""Add primary key to the regression test category links
+
+Revision ID: f2a7c9d18e45
+Revises: d41a9b6e53c0
+Create Date: 2026-10-18 14:05:21.637052
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9d18e45'
+down_revision = 'd41a9b6e53c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Links without a test or category are meaningless, and duplicate links have to go before the key can be added
+    op.execute('DELETE FROM regression_test_category WHERE regression_id IS NULL OR category_id IS NULL')
+    op.execute('CREATE TABLE regression_test_category_distinct AS '
+               'SELECT DISTINCT regression_id, category_id FROM regression_test_category')
+    op.execute('DELETE FROM regression_test_category')
+    op.execute('INSERT INTO regression_test_category (regression_id, category_id) '
+               'SELECT regression_id, category_id FROM regression_test_category_distinct')
+    op.execute('DROP TABLE regression_test_category_distinct')
+    with op.batch_alter_table('regression_test_category', schema=None) as batch_op:
+        batch_op.alter_column('regression_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('category_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('pk_regression_test_category', ['regression_id', 'category_id'])
+
+
+def downgrade():
+    # MySQL won't drop the primary key while the foreign key on regression_id relies on it
+    op.create_index('ix_regression_test_category_regression_id', 'regression_test_category', ['regression_id'],
+                    unique=False)
+    with op.batch_alter_table('regression_test_category', schema=None) as batch_op:
+        batch_op.drop_constraint('pk_regression_test_category', type_='primary')
+        batch_op.alter_column('category_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('regression_id', existing_type=sa.Integer(), nullable=True)
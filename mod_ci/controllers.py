@@ -22,6 +22,7 @@ from lxml import etree
 from markdown2 import markdown
 from pymysql.err import IntegrityError
 from sqlalchemy import and_, func
+from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import label
 from sqlalchemy.sql.functions import count
 from werkzeug.utils import secure_filename
@@ -34,13 +35,16 @@ from mod_ci.forms import AddUsersToBlacklist, DeleteUserForm
 from mod_ci.models import (BlockedUsers, CategoryTestInfo, GcpInstance,
                            MaintenanceMode, PrCommentInfo, Status)
 from mod_customized.models import CustomizedTest
+from mod_home.controllers import clear_index_cache
 from mod_home.models import CCExtractorVersion, GeneralData
 from mod_regression.models import (Category, RegressionTest,
                                    RegressionTestOutput)
+from mod_sample.controllers import clear_latest_tests_cache
 from mod_sample.models import Issue
 from mod_test.controllers import get_test_results
 from mod_test.models import (Fork, Test, TestPlatform, TestProgress,
                              TestResult, TestResultFile, TestStatus, TestType)
+from mod_upload.controllers import HASH_BLOCK_SIZE
 from utility import is_valid_signature, request_from_github
 
 mod_ci = Blueprint('ci', __name__)
@@ -309,7 +313,10 @@ def start_test(compute, app, db, repository: Repository.Repository, test, bot_to
     base_folder = os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'vm_data', gcp_instance_name, 'ci-tests')
     Path(base_folder).mkdir(parents=True, exist_ok=True)
 
-    categories = Category.query.order_by(Category.id.desc()).all()
+    # The outputs of every regression test are written below, so fetch them for all tests at once
+    categories = Category.query.options(
+        selectinload(Category.regression_tests).selectinload(RegressionTest.output_files)
+    ).order_by(Category.id.desc()).all()
     commit_name = 'fetch_commit_' + test.platform.value
     commit_hash = GeneralData.query.filter(GeneralData.key == commit_name).first().value
     last_commit = Test.query.filter(and_(Test.commit == commit_hash, Test.platform == test.platform)).first()
@@ -894,7 +901,10 @@ def start_ci():
 
                 last_commit.value = ref.object.sha
                 g.db.commit()
+                clear_index_cache()
                 add_test_entry(g.db, commit_hash, TestType.commit)
+                # After adding the test entries, so they can't be missed by a page cached in between
+                clear_latest_tests_cache()
             else:
                 g.log.warning('Unknown push type! Dumping payload for analysis')
                 g.log.warning(payload)
@@ -978,6 +988,8 @@ def start_ci():
                 g.log.debug("Received delete/unpublished action")
                 CCExtractorVersion.query.filter_by(version=release_version).delete()
                 g.db.commit()
+                clear_index_cache()
+                clear_latest_tests_cache()
                 g.log.info(f"Successfully deleted release {release_version} on {action} action")
             elif action in ["edited", "published"]:
                 g.log.debug(f"Latest release version is {release_version}")
@@ -991,6 +1003,8 @@ def start_ci():
                     release = CCExtractorVersion(release_version, release_date, release_commit)
                     g.db.add(release)
                 g.db.commit()
+                clear_index_cache()
+                clear_latest_tests_cache()
                 g.log.info(f"Successfully updated release version with webhook action '{action}'")
                 # adding test corresponding to last commit to the baseline regression results
                 # this is not altered when a release is deleted or unpublished since it's based on commit
@@ -1476,7 +1490,7 @@ def upload_type_request(log, test_id, repo_folder, test, request) -> bool:
         # Get hash and check if it's already been submitted
         hash_sha256 = hashlib.sha256()
         with open(temp_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
                 hash_sha256.update(chunk)
         file_hash = hash_sha256.hexdigest()
         filename, file_extension = os.path.splitext(filename)
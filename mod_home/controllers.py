@@ -1,12 +1,15 @@
 """maintains all functionalities running on homepage."""
-from flask import Blueprint, g
+from flask import Blueprint, g, request
 
 from decorators import template_renderer
 from mod_auth.models import Role
 from mod_home.models import CCExtractorVersion, GeneralData
+from utility import cache
 
 mod_home = Blueprint('home', __name__)
 
+INDEX_CACHE_TIMEOUT = 60
+
 
 @mod_home.before_app_request
 def before_app_request() -> None:
@@ -18,12 +21,33 @@ def before_app_request() -> None:
     }
 
 
+def index_cache_key() -> str:
+    """
+    Get the cache key for the rendered index page.
+
+    The page only varies with the role of the user (menu entries and test access), so it's cached per role.
+
+    :return: cache key for the current user
+    :rtype: str
+    """
+    role = 'anonymous' if g.user is None else g.user.role.value
+    return f'home/index/{role}'
+
+
+def clear_index_cache() -> None:
+    """Drop the cached index pages, so that a new commit or release shows up immediately."""
+    cache.delete_many('home/index/anonymous', *[f'home/index/{role.value}' for role in Role])
+
+
 @mod_home.route('/', methods=['GET', 'POST'])
+@cache.cached(timeout=INDEX_CACHE_TIMEOUT, key_prefix=index_cache_key, unless=lambda: request.method != 'GET')
 @template_renderer()
 def index():
     """Render index home page."""
-    last_commit = GeneralData.query.filter(GeneralData.key == 'last_commit').first().value
-    last_release = CCExtractorVersion.query.order_by(CCExtractorVersion.released.desc()).first()
+    # Read-only queries, so skip the dirty-state scan of the identity map before each one
+    with g.db.no_autoflush:
+        last_commit = GeneralData.query.filter(GeneralData.key == 'last_commit').first().value
+        last_release = CCExtractorVersion.query.order_by(CCExtractorVersion.released.desc()).first()
     test_access = False
     if g.user is not None and g.user.role in [Role.tester, Role.contributor, Role.admin]:
         test_access = True
@@ -12,7 +12,7 @@ List of models corresponding to mysql tables:
 from datetime import datetime
 from typing import Any, Dict, Type
 
-from sqlalchemy import Column, Date, Integer, String, Text
+from sqlalchemy import Column, Date, Index, Integer, String, Text
 
 import database
 from database import Base, DeclEnum
@@ -57,6 +57,15 @@ class CCExtractorVersion(Base):
         return f"<Version {self.version}>"
 
 
+# Covering index for the homepage's "latest release" lookup, answered from the index alone without a filesort
+Index(
+    'ix_ccextractor_version_released_desc',
+    CCExtractorVersion.released.desc(),
+    CCExtractorVersion.commit,
+    CCExtractorVersion.version
+)
+
+
 class GeneralData(Base):
     """Model to manage general data."""
 
@@ -1,8 +1,13 @@
 """Maintain logic to perform CRUD operations on regression tests."""
 
-from flask import (Blueprint, abort, flash, g, jsonify, redirect, request,
-                   url_for)
-from sqlalchemy import and_
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from flask import (Blueprint, Response, abort, flash, g, has_app_context,
+                   jsonify, redirect, request, url_for)
+from sqlalchemy import and_, event, insert, literal, select, union_all
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
 
 from decorators import template_renderer
 from mod_auth.controllers import check_access_rights, login_required
@@ -12,36 +17,241 @@ from mod_regression.forms import (AddCategoryForm, AddCorrectOutputForm,
                                   RemoveCorrectOutputForm)
 from mod_regression.models import (Category, InputType, OutputType,
                                    RegressionTest, RegressionTestOutput,
-                                   RegressionTestOutputFiles)
-from mod_sample.models import Sample, Tag
+                                   RegressionTestOutputFiles,
+                                   regressionTestLinkTable)
+from mod_sample.models import Sample, Tag, sample_tag_association
 from mod_test.models import TestResultFile
-from utility import serve_file_download
+from utility import cache, serve_file_download
 
 mod_regression = Blueprint('regression', __name__)
 
+VIEW_CACHE_TIMEOUT = 300
+VIEW_CACHE_VERSION_KEY = 'regression/version'
+CHOICES_CACHE_TIMEOUT = 300
+CHOICES_CACHE_KEY = 'regression/choices'
+# Keys in the info of a session with uncommitted changes to the cached data
+VIEW_CACHE_CHANGED = 'regression/view_changed'
+CHOICES_CACHE_CHANGED = 'regression/choices_changed'
+VIEW_CACHE_MODELS = (Category, RegressionTest, RegressionTestOutput, RegressionTestOutputFiles, Sample, Tag)
+CHOICES_CACHE_MODELS = (Category, Sample)
+# Read-only, so a single instance can be shared by all requests
+MENU_ENTRY = {
+    'title': 'Regression tests',
+    'icon': 'industry',
+    'route': 'regression.index'
+}
+
 
 @mod_regression.before_app_request
 def before_app_request() -> None:
     """Curate menu entries before app request."""
-    g.menu_entries['regression'] = {
-        'title': 'Regression tests',
-        'icon': 'industry',
-        'route': 'regression.index'
-    }
+    g.menu_entries['regression'] = MENU_ENTRY
+
+
+def get_view_cache_version() -> str:
+    """
+    Get the version of the data shown on the cached regression pages.
+
+    The version is a random token that is replaced whenever that data changes. It never expires, so an old version
+    can't come back and match stale cached pages or ETags.
+
+    :return: current data version
+    :rtype: str
+    """
+    version = cache.get(VIEW_CACHE_VERSION_KEY)
+    if version is None:
+        version = uuid4().hex
+        cache.set(VIEW_CACHE_VERSION_KEY, version, timeout=0)
+    return version
+
+
+def view_cache_key() -> str:
+    """
+    Get the cache key for the rendered page of the current request.
+
+    The key contains the data version, and the role of the user, as that decides which links and menu entries are
+    shown.
+
+    The key is computed once per request, so the ETag of the index page matches the version its body was cached
+    under, even if the data changes while the request is handled.
+
+    :return: cache key for the current page, user and data version
+    :rtype: str
+    """
+    if 'regression_view_cache_key' not in g:
+        role = 'anonymous' if g.user is None else g.user.role.value
+        g.regression_view_cache_key = f'regression/{get_view_cache_version()}/{role}{request.path}'
+    return g.regression_view_cache_key
+
+
+@mod_regression.before_request
+def forget_view_cache_key() -> None:
+    """Forget the cache key of an earlier request, in case it was handled in the same app context."""
+    g.pop('regression_view_cache_key', None)
+
+
+def invalidate_view_cache() -> None:
+    """Replace the data version of the cached regression pages, so that cached copies are no longer served."""
+    # Scripts such as the regression updater modify these models outside of the app
+    if has_app_context():
+        cache.set(VIEW_CACHE_VERSION_KEY, uuid4().hex, timeout=0)
+
+
+def invalidate_choices_cache() -> None:
+    """Drop the cached sample and category choices of the regression test forms."""
+    if has_app_context():
+        cache.delete(CHOICES_CACHE_KEY)
+
+
+def mark_view_cache_changed(session: Session) -> None:
+    """
+    Note that the session changed data shown on the cached regression pages, to invalidate them once it commits.
+
+    :param session: session that made the change
+    :type session: Session
+    """
+    session.info[VIEW_CACHE_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def record_cache_changes(session: Session, flush_context: Any) -> None:
+    """
+    Record whether the flushed changes affect the cached pages or choices.
+
+    The caches are only invalidated when the changes are committed. Otherwise a request running at the same time could
+    render the data from before the commit and cache it under the new version.
+
+    :param session: session that was flushed
+    :type session: Session
+    :param flush_context: internal state of the flush
+    :type flush_context: Any
+    """
+    changed = [*session.new, *session.dirty, *session.deleted]
+    if any(isinstance(instance, VIEW_CACHE_MODELS) for instance in changed):
+        mark_view_cache_changed(session)
+    if any(isinstance(instance, CHOICES_CACHE_MODELS) for instance in changed):
+        session.info[CHOICES_CACHE_CHANGED] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_caches(session: Session) -> None:
+    """
+    Invalidate the caches affected by the committed changes.
+
+    :param session: session that was committed
+    :type session: Session
+    """
+    if session.info.pop(VIEW_CACHE_CHANGED, False):
+        invalidate_view_cache()
+    if session.info.pop(CHOICES_CACHE_CHANGED, False):
+        invalidate_choices_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_cache_changes(session: Session) -> None:
+    """
+    Forget the changes of a rolled back transaction, as the cached data is still current.
+
+    :param session: session that was rolled back
+    :type session: Session
+    """
+    session.info.pop(VIEW_CACHE_CHANGED, None)
+    session.info.pop(CHOICES_CACHE_CHANGED, None)
+
+
+def get_test_form_choices() -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Get the choices for the sample and category fields of the regression test forms.
+
+    Both lists are fetched in a single round trip and cached together.
+
+    :return: lists of (id, label) pairs, keyed by 'sample' and 'category'
+    :rtype: dict
+    """
+    choices = cache.get(CHOICES_CACHE_KEY)
+    if choices is None:
+        choices = {'sample': [], 'category': []}
+        rows = g.db.execute(union_all(
+            select(literal('sample').label('kind'), Sample.id.label('id'), Sample.sha.label('label')),
+            select(literal('category'), Category.id, Category.name)
+        ))
+        for kind, choice_id, label in rows:
+            choices[kind].append((choice_id, label))
+        # A compound select has no order of its own
+        choices['sample'].sort(key=lambda choice: choice[0])
+        choices['category'].sort(key=lambda choice: choice[1])
+        cache.set(CHOICES_CACHE_KEY, choices, timeout=CHOICES_CACHE_TIMEOUT)
+    return choices
+
+
+def get_test_category_id(regression_id: int) -> Optional[int]:
+    """
+    Get the id of the category a regression test belongs to, without loading the categories themselves.
+
+    :param regression_id: id of the regression test
+    :type regression_id: int
+    :return: id of the category, None if the test has none
+    :rtype: Optional[int]
+    """
+    return g.db.query(regressionTestLinkTable.c.category_id).filter(
+        regressionTestLinkTable.c.regression_id == regression_id).limit(1).scalar()
+
+
+@mod_regression.after_request
+def add_index_cache_headers(response: Response) -> Response:
+    """
+    Let browsers and proxies revalidate the index page with an ETag instead of downloading it again.
+
+    :param response: response of the current request
+    :type response: Response
+    :return: response with caching headers, or a 304 if the client's copy is still current
+    :rtype: Response
+    """
+    if request.endpoint == 'regression.index' and response.status_code == 200:
+        etag = f'{view_cache_key()}/{g.build_commit}'
+        response.set_etag(hashlib.sha256(etag.encode()).hexdigest())
+        # Revalidate on every visit, as the pages that change the tests redirect back to the index
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+    return response
 
 
 @mod_regression.route('/')
+@cache.cached(timeout=VIEW_CACHE_TIMEOUT, key_prefix=view_cache_key)
 @template_renderer()
 def index():
     """Display all regression tests."""
+    # The listing only reads a few columns of every test, its categories and its sample's tags, so fetch them as plain
+    # rows instead of building ORM objects
+    categories_by_test: Dict[int, List[Dict[str, Any]]] = {}
+    for regression_id, category_id in g.db.execute(
+            select(regressionTestLinkTable.c.regression_id, regressionTestLinkTable.c.category_id)):
+        categories_by_test.setdefault(regression_id, []).append({'id': category_id})
+    tags_by_sample: Dict[int, List[Any]] = {}
+    for tag in g.db.execute(select(sample_tag_association.c.sample_id, Tag.id, Tag.name, Tag.description).join(
+            Tag, Tag.id == sample_tag_association.c.tag_id)):
+        tags_by_sample.setdefault(tag.sample_id, []).append(tag)
+    tests = [
+        {
+            'id': test.id,
+            'command': test.command,
+            'active': test.active,
+            'categories': categories_by_test.get(test.id, []),
+            'sample': {'id': test.sample_id, 'sha': test.sha, 'tags': tags_by_sample.get(test.sample_id, [])}
+        } for test in g.db.execute(select(
+            RegressionTest.id, RegressionTest.command, RegressionTest.active, RegressionTest.sample_id, Sample.sha
+        ).join(Sample, Sample.id == RegressionTest.sample_id))
+    ]
     return {
-        'tests': RegressionTest.query.all(),
+        'tests': tests,
         'categories': Category.query.order_by(Category.name.asc()).all(),
         'tags': Tag.query.all()
     }
 
 
-@mod_regression.route('/sample/<sample_id>')
+@mod_regression.route('/sample/<int:sample_id>')
+@cache.cached(timeout=VIEW_CACHE_TIMEOUT, key_prefix=view_cache_key)
 @template_renderer()
 def by_sample(sample_id):
     """
@@ -52,19 +262,23 @@ def by_sample(sample_id):
     :return: regression tests of the sample
     :rtype: dict
     """
-    # Show all regression tests for sample
-    sample = Sample.query.filter(Sample.id == sample_id).first()
-    if sample is None:
+    # Show all regression tests for sample, fetching the sample and its tests in one go
+    rows = g.db.query(Sample, RegressionTest.id, RegressionTest.command).options(
+        load_only(Sample.id, Sample.sha)
+    ).outerjoin(RegressionTest, RegressionTest.sample_id == Sample.id).filter(
+        Sample.id == sample_id
+    ).order_by(RegressionTest.id).all()
+    if len(rows) == 0:
         g.log.error(f'requested sample with id: {sample_id} not found!')
         abort(404)
     return {
-        'sample': sample,
-        'tests': RegressionTest.query.filter(
-            RegressionTest.sample_id == sample.id).all()
+        'sample': rows[0].Sample,
+        'tests': [row for row in rows if row.id is not None]
     }
 
 
-@mod_regression.route('/test/<regression_id>/view')
+@mod_regression.route('/test/<int:regression_id>/view')
+@cache.cached(timeout=VIEW_CACHE_TIMEOUT, key_prefix=view_cache_key)
 @template_renderer()
 def test_view(regression_id):
     """
@@ -75,7 +289,11 @@ def test_view(regression_id):
     :return: Regression test
     :rtype: dict
     """
-    test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
+    # Load everything the page shows up front, instead of lazily per output file
+    test = g.db.get(RegressionTest, regression_id, options=[
+        joinedload(RegressionTest.sample).selectinload(Sample.tags),
+        selectinload(RegressionTest.output_files).selectinload(RegressionTestOutput.multiple_files)
+    ])
 
     if test is None:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
@@ -86,7 +304,7 @@ def test_view(regression_id):
     }
 
 
-@mod_regression.route('/test/<regression_id>/delete', methods=['GET', 'POST'])
+@mod_regression.route('/test/<int:regression_id>/delete', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -101,7 +319,7 @@ def test_delete(regression_id):
     :return: Redirect
     """
     # Show a Single Test
-    test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
+    test = g.db.get(RegressionTest, regression_id)
 
     if test is None:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
@@ -110,8 +328,15 @@ def test_delete(regression_id):
     form = ConfirmationForm()
 
     if form.validate_on_submit():
-        g.db.delete(test)
+        # Unlink categories and outputs with one statement each instead of loading them first. Customized tests and
+        # test results are removed by the ON DELETE CASCADE of their foreign keys.
+        g.db.execute(regressionTestLinkTable.delete().where(regressionTestLinkTable.c.regression_id == test.id))
+        RegressionTestOutput.query.filter(RegressionTestOutput.regression_id == test.id).update(
+            {RegressionTestOutput.regression_id: None}, synchronize_session=False)
+        RegressionTest.query.filter(RegressionTest.id == test.id).delete(synchronize_session=False)
         g.db.commit()
+        # Bulk statements don't trigger the mapper events
+        invalidate_view_cache()
         g.log.warning(f'regression test with id: {regression_id} deleted!')
         flash('Regression Test Deleted')
         return redirect(url_for('.index'))
@@ -122,7 +347,7 @@ def test_delete(regression_id):
     }
 
 
-@mod_regression.route('/test/<regression_id>/edit', methods=['GET', 'POST'])
+@mod_regression.route('/test/<int:regression_id>/edit', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -135,23 +360,44 @@ def test_edit(regression_id):
     param regression_id : The ID of the Regression Test
     type regression_id : int
     """
-    test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
+    test = g.db.get(RegressionTest, regression_id)
 
     if test is None:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
         abort(404)
 
     form = EditTestForm(request.form)
-    form.sample_id.choices = [(sam.id, sam.sha) for sam in Sample.query.all()]
-    form.category_id.choices = [(cat.id, cat.name) for cat in Category.query.all()]
+    choices = get_test_form_choices()
+    form.sample_id.choices = choices['sample']
+    form.category_id.choices = choices['category']
 
     if form.validate_on_submit():
-        # Remove category for test and add again.
-        old_category = Category.query.filter(Category.id == test.categories[0].id).first()
-        old_category.regression_tests.remove(test)
-
-        new_category = Category.query.filter(Category.id == form.category_id.data).first()
-        new_category.regression_tests.append(test)
+        old_category_id = get_test_category_id(test.id)
+        current = (test.sample_id, test.command, old_category_id, test.expected_rc, test.input_type.value,
+                   test.output_type.value, test.description)
+        submitted = (form.sample_id.data, form.command.data, form.category_id.data, form.expected_rc.data,
+                     form.input_type.data, form.output_type.data, form.description.data)
+        if submitted == current:
+            # Back to the form, as the test view doesn't show flashed messages
+            flash('No changes were made to the regression test')
+            return redirect(url_for('.test_edit', regression_id=regression_id))
+
+        # Move the test to the new category through its link rows, without loading either category
+        if old_category_id != form.category_id.data:
+            if old_category_id is not None:
+                g.db.execute(regressionTestLinkTable.delete().where(and_(
+                    regressionTestLinkTable.c.regression_id == test.id,
+                    regressionTestLinkTable.c.category_id == old_category_id
+                )))
+            # The test can already be in the new category as well
+            linked = g.db.query(regressionTestLinkTable.c.category_id).filter(
+                regressionTestLinkTable.c.regression_id == test.id,
+                regressionTestLinkTable.c.category_id == form.category_id.data
+            ).first() is not None
+            if not linked:
+                g.db.execute(regressionTestLinkTable.insert().values(
+                    regression_id=test.id, category_id=form.category_id.data))
+            mark_view_cache_changed(g.db)
 
         test.sample_id = form.sample_id.data
         test.command = form.command.data
@@ -169,7 +415,7 @@ def test_edit(regression_id):
         # Populate form with current set sample values
         form.sample_id.data = test.sample_id
         form.command.data = test.command
-        form.category_id.data = test.categories[0].id
+        form.category_id.data = get_test_category_id(test.id)
         form.expected_rc.data = test.expected_rc
         form.input_type.data = test.input_type.value
         form.output_type.data = test.output_type.value
@@ -178,46 +424,55 @@ def test_edit(regression_id):
     return {'form': form, 'regression_id': regression_id}
 
 
-@mod_regression.route('/test/<regression_id>/toggle')
+@mod_regression.route('/test/<int:regression_id>/active', methods=['PUT'])
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
-def toggle_active_status(regression_id):
+def set_active_status(regression_id):
     """
-    Change active status of the regression test.
+    Set the active status of the regression test.
+
+    Expects a JSON body such as {"active": true}. Setting the same status twice has no further effect, so the request
+    can safely be retried.
 
     :param regression_id: id of the regression test
     :type regression_id: int
-    :return: response of status toggle
+    :return: response of status update
     :rtype: dict
     """
-    regression_test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
-    if regression_test is None:
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('active', None), bool):
+        abort(400)
+    active = data['active']
+    # The MySQL dialect counts matched rather than changed rows, so an unchanged test isn't mistaken for a missing one
+    updated = RegressionTest.query.filter(RegressionTest.id == regression_id).update(
+        {RegressionTest.active: active}, synchronize_session=False)
+    if updated == 0:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
         abort(404)
-    regression_test.active = not regression_test.active
     g.db.commit()
+    invalidate_view_cache()
     return jsonify({
         "status": "success",
-        "active": str(regression_test.active)
+        "active": str(active)
     })
 
 
-@mod_regression.route('/test/<regression_test_output_id>/download', methods=['GET'])
+@mod_regression.route('/test/<int:regression_test_output_id>/download', methods=['GET'])
 @login_required
 def test_result_file(regression_test_output_id):
     """View the output files of the regression test."""
-    rto = RegressionTestOutput.query.filter(RegressionTestOutput.id == regression_test_output_id).first()
+    rto = g.db.get(RegressionTestOutput, regression_test_output_id)
     if rto is None:
         g.log.error(f'requested regression test output with id: {regression_test_output_id} not found!')
         abort(404)
     return serve_file_download(rto.filename_correct, 'TestResults')
 
 
-@mod_regression.route('/test/<regression_test_output_id>/download/variant', methods=['GET'])
+@mod_regression.route('/test/<int:regression_test_output_id>/download/variant', methods=['GET'])
 @login_required
 def multiple_test_result_file(regression_test_output_id):
     """View the output files of the regression test (variants)."""
-    rtof = RegressionTestOutputFiles.query.filter(RegressionTestOutputFiles.id == regression_test_output_id).first()
+    rtof = g.db.get(RegressionTestOutputFiles, regression_test_output_id)
     if rtof is None:
         g.log.error(f'requested regression test output file with id: {regression_test_output_id} not found!')
         abort(404)
@@ -236,8 +491,9 @@ def test_add():
     :rtype: dict
     """
     form = AddTestForm(request.form)
-    form.sample_id.choices = [(sam.id, sam.sha) for sam in Sample.query.all()]
-    form.category_id.choices = [(cat.id, cat.name) for cat in Category.query.all()]
+    choices = get_test_form_choices()
+    form.sample_id.choices = choices['sample']
+    form.category_id.choices = choices['category']
     if form.validate_on_submit():
         new_test = RegressionTest(
             sample_id=form.sample_id.data,
@@ -249,14 +505,14 @@ def test_add():
             description=form.description.data,
         )
         g.db.add(new_test)
-        category = Category.query.filter(Category.id == form.category_id.data).first()
-        category.regression_tests.append(new_test)
+        # Link from the new test's side, so the category's existing tests aren't loaded
+        new_test.categories.append(g.db.get(Category, form.category_id.data))
         g.db.commit()
         return redirect(url_for('.index'))
     return {'form': form}
 
 
-@mod_regression.route('/category/<category_id>/delete', methods=['GET', 'POST'])
+@mod_regression.route('/category/<int:category_id>/delete', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -269,7 +525,7 @@ def category_delete(category_id):
     :return: form and category
     :rtype: dict
     """
-    category = Category.query.filter(Category.id == category_id).first()
+    category = g.db.get(Category, category_id)
 
     if category is None:
         g.log.error(f'requested category with id: {category_id} not found!')
@@ -288,7 +544,7 @@ def category_delete(category_id):
     }
 
 
-@mod_regression.route('/category/<category_id>/edit', methods=['GET', 'POST'])
+@mod_regression.route('/category/<int:category_id>/edit', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -301,14 +557,14 @@ def category_edit(category_id):
     :return: form and category id
     :rtype: dict
     """
-    category = Category.query.filter(Category.id == category_id).first()
+    category = g.db.get(Category, category_id)
 
     if category is None:
         g.log.error(f'requested category with id: {category_id} not found!')
         abort(404)
 
     form = AddCategoryForm(request.form)
-    if form.validate():
+    if form.validate_on_submit():
         category.name = form.category_name.data
         category.description = form.category_description.data
         g.db.commit()
@@ -324,6 +580,22 @@ def category_edit(category_id):
     return {'form': form, 'category_id': category_id}
 
 
+def category_bulk_add(categories: List[Tuple[str, str]]) -> None:
+    """
+    Add regression test categories using a single INSERT statement.
+
+    :param categories: name and description of each category to add
+    :type categories: List[Tuple[str, str]]
+    """
+    if len(categories) == 0:
+        return
+    g.db.execute(insert(Category), [{'name': name, 'description': description} for name, description in categories])
+    g.db.commit()
+    # Core inserts don't trigger the mapper events, so invalidate the caches here
+    invalidate_view_cache()
+    invalidate_choices_cache()
+
+
 @mod_regression.route('/category_add', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
@@ -336,17 +608,14 @@ def category_add():
     :rtype: dict
     """
     form = AddCategoryForm(request.form)
-    if form.validate():
-        new_category = Category(
-            name=form.category_name.data, description=form.category_description.data)
-        g.db.add(new_category)
-        g.db.commit()
+    if form.validate_on_submit():
+        category_bulk_add([(form.category_name.data, form.category_description.data)])
         flash('New Category Added')
         return redirect(url_for('.index'))
     return {'form': form}
 
 
-@mod_regression.route('/test/<regression_id>/output/new', methods=['GET', 'POST'])
+@mod_regression.route('/test/<int:regression_id>/output/new', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -359,33 +628,43 @@ def output_add(regression_id):
     param regression_id : The ID of the Regression Test
     type regression_id : int
     """
-    test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
+    test = g.db.get(RegressionTest, regression_id, options=[
+        selectinload(RegressionTest.output_files).selectinload(RegressionTestOutput.multiple_files)
+    ])
 
     if test is None:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
         abort(404)
 
     form = AddCorrectOutputForm(request.form)
-    test_result = TestResultFile.query.filter(
-        and_(TestResultFile.regression_test_id == regression_id, TestResultFile.got.isnot(None))
-    ).order_by(TestResultFile.test_id.desc()).limit(50).all()
-    check_doubles = {}
-    for result in test_result:
-        if result.got not in check_doubles:
-            append = True
-            for output_file in result.regression_test_output.multiple_files:
-                if result.got.strip() == output_file.file_hashes.strip():
-                    append = False
-                    break
-            if append:
-                check_doubles[result.got] = int(result.test_id)
-    form.output_file.choices = [(output.id, output.filename_correct + ' (original)') for output in test.output_files]
-    form.test_id.choices = [f'Test id {test_id} with output {got}' for got, test_id in check_doubles.items()]
+    # Building the choices only reads, so there is nothing to flush before the queries
+    with g.db.no_autoflush:
+        # Only the columns of the 50 most recent results, repeated outputs among them are dropped below
+        test_results = g.db.query(
+            TestResultFile.test_id, TestResultFile.regression_test_output_id, TestResultFile.got
+        ).filter(
+            TestResultFile.regression_test_id == regression_id, TestResultFile.got.isnot(None)
+        ).order_by(TestResultFile.test_id.desc()).limit(50).all()
+        # Variants that are already known for each output, so results can be checked against them with a set lookup
+        existing = {
+            (output.id, output_file.file_hashes.strip()) for output in test.output_files
+            for output_file in output.multiple_files
+        }
+        check_doubles = {}
+        for test_id, output_id, got in test_results:
+            if got not in check_doubles and (output_id, got.strip()) not in existing:
+                check_doubles[got] = int(test_id)
+        form.output_file.choices = [
+            (output.id, output.filename_correct + ' (original)') for output in test.output_files
+        ]
+        # The value of each choice is the output hash itself, so nothing needs to be parsed from the label
+        form.test_id.choices = [
+            (got.strip(), f'Test id {test_id} with output {got}') for got, test_id in check_doubles.items()
+        ]
     if form.validate_on_submit():
-        test_data = form.test_id.data.strip().split()
         new_output = RegressionTestOutputFiles(
             regression_test_output_id=form.output_file.data,
-            file_hashes=test_data[5]
+            file_hashes=form.test_id.data
         )
         g.db.add(new_output)
         g.db.commit()
@@ -394,7 +673,7 @@ def output_add(regression_id):
     return {'form': form, 'regression_id': regression_id}
 
 
-@mod_regression.route('/test/<regression_id>/output/remove', methods=['GET', 'POST'])
+@mod_regression.route('/test/<int:regression_id>/output/remove', methods=['GET', 'POST'])
 @template_renderer()
 @login_required
 @check_access_rights([Role.contributor, Role.admin])
@@ -407,21 +686,24 @@ def output_remove(regression_id):
     param regression_id : The ID of the Regression Test
     type regression_id : int
     """
-    test = RegressionTest.query.filter(RegressionTest.id == regression_id).first()
+    test = g.db.get(RegressionTest, regression_id)
 
     if test is None:
         g.log.error(f'requested regression test with id: {regression_id} not found!')
         abort(404)
 
     form = RemoveCorrectOutputForm(request.form)
-    form.output_file.choices = [(a.id, a.file_hashes + ' (variant)')
-                                for r in test.output_files for a in r.multiple_files]
+    variants = g.db.query(RegressionTestOutputFiles.id, RegressionTestOutputFiles.file_hashes).join(
+        RegressionTestOutput, RegressionTestOutput.id == RegressionTestOutputFiles.regression_test_output_id
+    ).filter(RegressionTestOutput.regression_id == test.id).all()
+    form.output_file.choices = [(variant_id, file_hashes + ' (variant)') for variant_id, file_hashes in variants]
     if form.validate_on_submit():
-        variant_file = RegressionTestOutputFiles.query.filter(
-            RegressionTestOutputFiles.id == form.output_file.data
-        ).first()
-        g.db.delete(variant_file)
+        # The choices only allow variants of this test, so it can be deleted without loading it
+        RegressionTestOutputFiles.query.filter(RegressionTestOutputFiles.id == form.output_file.data).delete(
+            synchronize_session=False)
         g.db.commit()
+        # Bulk statements don't trigger the mapper events
+        invalidate_view_cache()
         g.log.warning(f'Output file with id: {form.output_file.data} deleted!')
         return redirect(url_for('.test_view', regression_id=regression_id))
     return {'form': form, 'regression_id': regression_id}
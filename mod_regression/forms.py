@@ -1,8 +1,8 @@
 """Maintain forms related to CRUD operations on regression tests."""
 
 from flask_wtf import FlaskForm
-from wtforms import (HiddenField, IntegerField, SelectField, StringField,
-                     SubmitField, TextAreaField)
+from wtforms import (IntegerField, SelectField, StringField, SubmitField,
+                     TextAreaField)
 from wtforms.validators import DataRequired, InputRequired, Length
 
 from mod_regression.models import InputType, OutputType
@@ -53,7 +53,6 @@ class EditTestForm(CommonTestForm):
 class ConfirmationForm(FlaskForm):
     """Flask Form Used for Asking Confirmations."""
 
-    confirm = HiddenField('confirm', default='yes')
     submit = SubmitField('Confirm')
 
 
@@ -12,8 +12,8 @@ List of models corresponding to mysql tables:
 
 from typing import Any, Dict, Tuple, Type
 
-from sqlalchemy import (Boolean, Column, ForeignKey, Integer, String, Table,
-                        Text)
+from sqlalchemy import (Boolean, Column, ForeignKey, Index, Integer, String,
+                        Table, Text)
 from sqlalchemy.orm import relationship
 
 import database
@@ -22,8 +22,12 @@ from database import Base, DeclEnum
 regressionTestLinkTable = Table(
     'regression_test_category',
     Base.metadata,
-    Column('regression_id', Integer, ForeignKey('regression_test.id', onupdate='CASCADE', ondelete='RESTRICT')),
-    Column('category_id', Integer, ForeignKey('category.id', onupdate='CASCADE', ondelete='RESTRICT'))
+    Column('regression_id', Integer, ForeignKey('regression_test.id', onupdate='CASCADE', ondelete='RESTRICT'),
+           primary_key=True, nullable=False),
+    Column('category_id', Integer, ForeignKey('category.id', onupdate='CASCADE', ondelete='RESTRICT'),
+           primary_key=True, nullable=False),
+    # Covers loading the tests of a category, without reading the rows themselves
+    Index('ix_regression_test_category_category_id_regression_id', 'category_id', 'regression_id')
 )
 
 
@@ -3,25 +3,30 @@
 
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from time import gmtime, strftime
-from typing import List
+from typing import List, Optional
+
+from sqlalchemy.orm import joinedload, selectinload
 
 from database import create_session
 from mod_regression.models import RegressionTest
-from run import config
+from run import config, log
 
-INPUT_VIDEO_FOLDER = os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestFiles')
-OUTPUT_RESULTS_FOLDER = os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestResults')
+# Absolute already, so the paths of the samples and results don't need to be resolved one by one
+INPUT_VIDEO_FOLDER = os.path.abspath(os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestFiles'))
+OUTPUT_RESULTS_FOLDER = os.path.abspath(os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestResults'))
 LOG_DIR = os.path.join(os.path.expanduser('~'), 'sampleplatform_sample_update_logs')
 
 
 class Test:
     """Object to hold all test details and get methods."""
 
-    def __init__(self, input_file: str, args: str, output: str) -> None:
+    def __init__(self, input_file: str, args: str, output: str, test_id: int) -> None:
         self.input = input_file
         self.args = args
         self.output = output
+        self.test_id = test_id
 
     @staticmethod
     def get_inputfilepath(reg_test: RegressionTest) -> str:
@@ -34,10 +39,8 @@ class Test:
         :rtype: str
         """
         file_name = reg_test.sample.filename
-        file_path = os.path.join(INPUT_VIDEO_FOLDER, file_name)
-        abs_file_path = os.path.abspath(file_path)
 
-        return abs_file_path
+        return os.path.join(INPUT_VIDEO_FOLDER, file_name)
 
     @staticmethod
     def get_outputfilepath(reg_test: RegressionTest) -> str:
@@ -51,10 +54,8 @@ class Test:
         """
         output = reg_test.output_files[0]
         file_name = output.filename_correct
-        file_path = os.path.join(OUTPUT_RESULTS_FOLDER, file_name)
-        abs_file_path = os.path.abspath(file_path)
 
-        return abs_file_path
+        return os.path.join(OUTPUT_RESULTS_FOLDER, file_name)
 
     @staticmethod
     def run_ccex(path_to_ccex: str, log_file: str, input_file: str, args: str, output_file: str) -> bool:
@@ -80,38 +81,42 @@ class Test:
         proc_args.extend(['-o', output_file])
 
         try:
-            proc = subprocess.run(proc_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            with open(log_file, 'w+') as logf:
-                logf.write(proc.stdout.decode('utf-8'))
+            # Let ccextractor write its output straight to the log file, instead of collecting it in memory first
+            with open(log_file, 'wb') as logf:
+                proc = subprocess.run(proc_args, stdout=logf, stderr=subprocess.STDOUT)
             if proc.returncode != 0:
-                print(f'ERROR: ccextractor encountered error for {input_file}, please see {log_file}')
-                print(f'ccextractor was run as {" ".join(proc_args)}')
+                log.error(f'ccextractor encountered error for {input_file}, please see {log_file}')
+                log.error(f'ccextractor was run as {" ".join(proc_args)}')
                 return False
             return True
         except subprocess.CalledProcessError as err:
-            print(f'ERROR: subprocess failed for {input_file}')
-            print(f'ERROR: The run for subprocess was "{" ".join(proc_args)}"')
+            log.error(f'subprocess failed for {input_file}')
+            log.error(f'The run for subprocess was "{" ".join(proc_args)}"')
             return False
 
 
-def update_expected_results(path_to_ccex: str) -> bool:
+def update_expected_results(path_to_ccex: str, jobs: Optional[int] = None) -> bool:
     """
     Update expected result in the regression.
 
     :param path_to_ccex: path to the ccextractor executable
     :type path_to_ccex: str
+    :param jobs: number of ccextractor runs at the same time, defaults to the number of CPUs
+    :type jobs: int, optional
     """
     DBSession = create_session(config['DATABASE_URI'])
 
     if not os.path.isfile(path_to_ccex):
         return False
 
-    all_regression_tests = DBSession.query(RegressionTest).all()
+    # Every test needs its sample and outputs, so fetch them for all tests at once
+    all_regression_tests = DBSession.query(RegressionTest).options(
+        joinedload(RegressionTest.sample), selectinload(RegressionTest.output_files)).all()
 
     tests_to_update = []
 
     if len(all_regression_tests) == 0:
-        print('INFO: No regression tests found!')
+        log.info('No regression tests found!')
         return True
 
     for test in all_regression_tests:
@@ -122,17 +127,25 @@ def update_expected_results(path_to_ccex: str) -> bool:
         tests_to_update.append(Test(
             input_file,
             args,
-            output_file
+            output_file,
+            test.id
         ))
 
     log_folder_name = strftime("%Y_%m_%dT%H_%M_%SZ", gmtime())
     log_folder_path = os.path.join(LOG_DIR, log_folder_name)
     os.makedirs(log_folder_path, exist_ok=True)
-    print(f'INFO: ccextractor logs can be found at {log_folder_path} for each sample after update')
+    log.info(f'ccextractor logs can be found at {log_folder_path} for each sample after update')
 
-    for test in tests_to_update:
-        log_file = os.path.join(log_folder_path, os.path.basename(test.input) + '.log')
+    def update(test: Test) -> None:
+        # Regression tests can share a sample, so the runs in parallel need a log file each
+        log_file = os.path.join(log_folder_path, f'{test.test_id}_{os.path.basename(test.input)}.log')
         success = Test.run_ccex(path_to_ccex, log_file, test.input, test.args, test.output)
         if success:
-            print(f'SUCCESS: output {output_file} updated for sample {input_file}')
+            # Each message is written whole, so the runs in parallel can't interleave their lines
+            log.info(f'output {test.output} updated for sample {test.input}')
+
+    # Every run is a separate ccextractor process, so threads are enough to keep all CPUs busy
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        # Consume the results, so exceptions raised in the workers aren't silently dropped
+        list(executor.map(update, tests_to_update))
     return True
@@ -1,10 +1,12 @@
 """Logic to fetch sample information, uploading, editing, deleting sample."""
 
 import os
-from operator import and_
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from flask import Blueprint, g, redirect, request, url_for
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import aliased, joinedload, selectinload
 
 from decorators import template_renderer
 from exceptions import SampleNotFoundException
@@ -16,13 +18,25 @@ from mod_sample.forms import (AddTagForm, DeleteAdditionalSampleForm,
                               DeleteSampleForm, EditSampleForm)
 from mod_sample.media_info_parser import (InvalidMediaInfoError,
                                           MediaInfoFetcher)
-from mod_sample.models import ExtraFile, Issue, Sample, Tag
+from mod_sample.models import ExtraFile, Sample, Tag
 from mod_test.models import Test, TestResult, TestResultFile
-from mod_upload.models import Platform
-from utility import serve_file_download
+from mod_upload.models import Platform, Upload
+from utility import cache, serve_file_download
 
 mod_sample = Blueprint('sample', __name__)
 
+LATEST_TESTS_CACHE_TIMEOUT = 60
+LATEST_TESTS_CACHE_KEY = 'sample/latest_tests'
+FILE_REMOVAL_WORKERS = 8
+# Everything the sample info page shows about a sample, fetched together with it
+SAMPLE_INFO_OPTIONS = (
+    joinedload(Sample.upload).joinedload(Upload.user),
+    joinedload(Sample.upload).joinedload(Upload.version),
+    selectinload(Sample.tags),
+    selectinload(Sample.extra_files),
+    selectinload(Sample.issues)
+)
+
 
 @mod_sample.before_app_request
 def before_app_request() -> None:
@@ -34,6 +48,76 @@ def before_app_request() -> None:
     }
 
 
+def get_test_statuses(tests: List[Optional[Test]], regression_test_ids: List[int]) -> List[str]:
+    """
+    Get the status of the given regression tests in each of the given test runs.
+
+    :param tests: the test runs, None where there is no test run
+    :type tests: list
+    :param regression_test_ids: ids of the regression tests to check
+    :type regression_test_ids: list
+    :return: 'Pass' or 'Fail' for every test run, or 'Unknown' where there's no test run
+    :rtype: list
+    """
+    test_ids = [test.id for test in tests if test is not None]
+    failed_test_ids: Set[int] = set()
+    if len(test_ids) > 0:
+        # Find the test runs with a wrong exit code or output, for all of them in a single statement
+        failed_test_ids = {row.test_id for row in g.db.execute(union(
+            select(TestResult.test_id).where(
+                TestResult.test_id.in_(test_ids),
+                TestResult.regression_test_id.in_(regression_test_ids),
+                TestResult.exit_code != TestResult.expected_rc
+            ),
+            select(TestResultFile.test_id).where(
+                TestResultFile.test_id.in_(test_ids),
+                TestResultFile.regression_test_id.in_(regression_test_ids),
+                TestResultFile.got.isnot(None)
+            )
+        ))}
+
+    return ['Unknown' if test is None else 'Fail' if test.id in failed_test_ids else 'Pass' for test in tests]
+
+
+def clear_latest_tests_cache() -> None:
+    """Drop the cached test runs of the latest commit and release, so that a new commit or release shows up."""
+    cache.delete(LATEST_TESTS_CACHE_KEY)
+
+
+def get_latest_tests() -> Tuple[Optional[Test], Optional[Test]]:
+    """
+    Get the test runs of the latest commit and of the last CCExtractor release.
+
+    :return: the first test run of the latest commit and of the last release, None where there is none
+    :rtype: tuple
+    """
+    test_ids = cache.get(LATEST_TESTS_CACHE_KEY)
+    if test_ids is not None:
+        # Only a primary key lookup, instead of searching the test runs by commit
+        tests = {test.id: test for test in Test.query.filter(Test.id.in_(test_ids))} if any(test_ids) else {}
+        return tests.get(test_ids[0]), tests.get(test_ids[1])
+
+    commit_test = aliased(Test)
+    release_test = aliased(Test)
+    last_release = select(CCExtractorVersion.commit).order_by(CCExtractorVersion.released.desc()).limit(1)
+    first_commit_test = select(func.min(Test.id)).where(Test.commit == GeneralData.value).correlate(GeneralData)
+    first_release_test = select(func.min(Test.id)).where(Test.commit == last_release.scalar_subquery())
+
+    # Resolve the commits and their tests in a single statement, starting from the latest commit
+    latest_tests = g.db.query(commit_test, release_test).select_from(GeneralData).outerjoin(
+        commit_test, commit_test.id == first_commit_test.scalar_subquery()
+    ).outerjoin(
+        release_test, release_test.id == first_release_test.scalar_subquery()
+    ).filter(GeneralData.key == 'last_commit').first()
+
+    test_commit, test_release = (None, None) if latest_tests is None else latest_tests
+    cache.set(LATEST_TESTS_CACHE_KEY, (
+        None if test_commit is None else test_commit.id,
+        None if test_release is None else test_release.id
+    ), timeout=LATEST_TESTS_CACHE_TIMEOUT)
+    return test_commit, test_release
+
+
 def display_sample_info(sample) -> Dict[str, Any]:
     """
     Fetch the media info.
@@ -55,50 +139,12 @@ def display_sample_info(sample) -> Dict[str, Any]:
             # in case no media info present in the sample
             media_info = None
 
-    latest_commit = GeneralData.query.filter(GeneralData.key == 'last_commit').first().value
-    last_release = CCExtractorVersion.query.order_by(CCExtractorVersion.released.desc()).first().commit
-
-    test_commit = Test.query.filter(Test.commit == latest_commit).first()
-    test_release = Test.query.filter(Test.commit == last_release).first()
-    regression_tests = RegressionTest.query.filter(RegressionTest.sample_id == sample.id).all()
-    status = 'Unknown'
-    status_release = 'Unknown'
-
-    if len(regression_tests) > 0:
-        if test_commit is not None:
-            sq = g.db.query(RegressionTest.id).filter(RegressionTest.sample_id == sample.id).subquery()
-            exit_code = g.db.query(TestResult.exit_code).filter(and_(
-                TestResult.exit_code != TestResult.expected_rc,
-                and_(TestResult.test_id == test_commit.id, TestResult.regression_test_id.in_(sq))
-            )).first()
-            not_null = g.db.query(TestResultFile.got).filter(and_(
-                TestResultFile.got.isnot(None),
-                and_(TestResultFile.test_id == test_commit.id, TestResultFile.regression_test_id.in_(sq))
-            )).first()
-
-            if exit_code is None and not_null is None:
-                status = 'Pass'
-            else:
-                status = 'Fail'
-
-        if test_release is not None:
-            sq = g.db.query(RegressionTest.id).filter(
-                RegressionTest.sample_id == sample.id).subquery()
-            exit_code = g.db.query(TestResult.exit_code).filter(
-                and_(
-                    TestResult.exit_code != TestResult.expected_rc,
-                    and_(TestResult.test_id == test_release.id, TestResult.regression_test_id.in_(sq))
-                )
-            ).first()
-            not_null = g.db.query(TestResultFile.got).filter(and_(
-                TestResultFile.got.isnot(None),
-                and_(TestResultFile.test_id == test_release.id, TestResultFile.regression_test_id.in_(sq))
-            )).first()
-
-            if exit_code is None and not_null is None:
-                status_release = 'Pass'
-            else:
-                status_release = 'Fail'
+    test_commit, test_release = get_latest_tests()
+    regression_test_ids = [
+        row.id for row in g.db.query(RegressionTest.id).filter(RegressionTest.sample_id == sample.id)]
+
+    if len(regression_test_ids) > 0:
+        status, status_release = get_test_statuses([test_commit, test_release], regression_test_ids)
     else:
         status = 'Not present in regression tests'
         status_release = 'Not present in regression tests'
@@ -106,13 +152,12 @@ def display_sample_info(sample) -> Dict[str, Any]:
     return {
         'sample': sample,
         'media': media_info,
-        'additional_files': ExtraFile.query.filter(
-            ExtraFile.sample_id == sample.id).all(),
+        'additional_files': sample.extra_files,
         'latest_commit': status,
         'latest_commit_test': test_commit,
         'latest_release': status_release,
         'latest_release_test': test_release,
-        'issues': Issue.query.filter(Issue.sample_id == sample.id).all()
+        'issues': sample.issues
     }
 
 
@@ -146,7 +191,7 @@ def sample_by_id(sample_id):
     :return: sample information if successful
     :rtype: dict
     """
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, int(sample_id), options=SAMPLE_INFO_OPTIONS)
     if sample is not None:
         return display_sample_info(sample)
 
@@ -165,14 +210,14 @@ def sample_by_hash(sample_hash):
     :return: sample info if successful
     :rtype: dict
     """
-    sample = Sample.query.filter(Sample.sha == sample_hash).first()
+    sample = Sample.query.options(*SAMPLE_INFO_OPTIONS).filter(Sample.sha == sample_hash).first()
     if sample is not None:
         return display_sample_info(sample)
 
     raise SampleNotFoundException(f"Sample with hash {sample_hash} not found.")
 
 
-@mod_sample.route('/download/<sample_id>')
+@mod_sample.route('/download/<int:sample_id>')
 @login_required
 def download_sample(sample_id):
     """
@@ -184,13 +229,13 @@ def download_sample(sample_id):
     :return: sample file
     :rtype: Flask response
     """
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id)
     if sample is not None:
         return serve_file_download(sample.filename, 'TestFiles')
     raise SampleNotFoundException('Sample not found')
 
 
-@mod_sample.route('/download/<sample_id>/media-info')
+@mod_sample.route('/download/<int:sample_id>/media-info')
 @login_required
 def download_sample_media_info(sample_id):
     """
@@ -203,7 +248,7 @@ def download_sample_media_info(sample_id):
     :rtype: Flask response
     """
     from run import config
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id)
 
     if sample is not None:
         # Fetch media info
@@ -217,7 +262,7 @@ def download_sample_media_info(sample_id):
     raise SampleNotFoundException(f"Sample with id {sample_id} not found")
 
 
-@mod_sample.route('/download/<sample_id>/additional/<additional_id>')
+@mod_sample.route('/download/<int:sample_id>/additional/<int:additional_id>')
 @login_required
 def download_sample_additional(sample_id, additional_id):
     """
@@ -232,9 +277,9 @@ def download_sample_additional(sample_id, additional_id):
     :return: sample's additional information file
     :rtype: Flask response
     """
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id)
     if sample is not None:
-        extra = ExtraFile.query.filter(ExtraFile.id == additional_id).first()
+        extra = g.db.get(ExtraFile, additional_id)
         if extra is not None:
             return serve_file_download(extra.filename, 'TestFiles', 'extra')
         raise SampleNotFoundException(f"Extra file {additional_id} for sample {sample.id} not found")
@@ -269,7 +314,7 @@ def add_tag():
     }
 
 
-@mod_sample.route('/edit/<sample_id>', methods=['GET', 'POST'])
+@mod_sample.route('/edit/<int:sample_id>', methods=['GET', 'POST'])
 @login_required
 @check_access_rights([Role.admin])
 @template_renderer()
@@ -283,16 +328,15 @@ def edit_sample(sample_id):
     :return: form to edit sample
     :rtype: dict
     """
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id, options=[joinedload(Sample.upload), selectinload(Sample.tags)])
 
     if sample is not None:
-        versions = CCExtractorVersion.query.all()
-        tags = Tag.query.all()
         # Process or render form
         form = EditSampleForm(request.form)
         add_tag_form = AddTagForm(request.form)
-        form.version.choices = [(v.id, v.version) for v in versions]
-        form.tags.choices = [(tag.id, tag.name) for tag in tags]
+        form.version.choices = [
+            (v.id, v.version) for v in g.db.query(CCExtractorVersion.id, CCExtractorVersion.version)]
+        form.tags.choices = [(tag.id, tag.name) for tag in g.db.query(Tag.id, Tag.name)]
 
         if form.validate_on_submit():
             # Store values
@@ -308,7 +352,7 @@ def edit_sample(sample_id):
 
         if not form.is_submitted():
             # Populate form with current set sample values
-            form.version.data = sample.upload.version.id
+            form.version.data = sample.upload.version_id
             form.platform.data = sample.upload.platform.name
             form.notes.data = sample.upload.notes
             form.parameters.data = sample.upload.parameters
@@ -323,7 +367,32 @@ def edit_sample(sample_id):
     raise SampleNotFoundException(f"Sample with id {sample_id} not found")
 
 
-@mod_sample.route('/delete/<sample_id>', methods=['GET', 'POST'])
+def remove_file(path: str) -> None:
+    """
+    Remove a file, if it still exists.
+
+    :param path: path of the file to remove
+    :type path: str
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_files(paths: List[str]) -> None:
+    """
+    Remove the given files in parallel, skipping the ones that are already gone.
+
+    :param paths: paths of the files to remove
+    :type paths: List[str]
+    """
+    # Each unlink blocks on the file system, so a sample with many extra files shouldn't wait for them one by one
+    with ThreadPoolExecutor(max_workers=FILE_REMOVAL_WORKERS) as executor:
+        list(executor.map(remove_file, paths))
+
+
+@mod_sample.route('/delete/<int:sample_id>', methods=['GET', 'POST'])
 @login_required
 @check_access_rights([Role.admin])
 @template_renderer()
@@ -338,20 +407,18 @@ def delete_sample(sample_id):
     :rtype: dict
     """
     from run import config
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id)
     if sample is not None:
         # Process or render form
         form = DeleteSampleForm(request.form)
         if form.validate_on_submit():
-            # Delete all files (sample, media info & additional files
+            # Collect all files (sample, media info & additional files) while the sample still exists
             basedir = os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestFiles')
-            os.remove(os.path.join(basedir, 'media', sample.sha + '.xml'))
-            for extra in sample.extra_files:
-                os.remove(os.path.join(basedir, 'extra', extra.filename))
-
-            os.remove(os.path.join(basedir, sample.filename))
+            paths = [os.path.join(basedir, 'media', sample.sha + '.xml'), os.path.join(basedir, sample.filename)]
+            paths.extend(os.path.join(basedir, 'extra', extra.filename) for extra in sample.extra_files)
             g.db.delete(sample)
             g.db.commit()
+            remove_files(paths)
             g.log.warning(f"sample with id: {sample_id} deleted")
             return redirect(url_for('.index'))
 
@@ -362,7 +429,7 @@ def delete_sample(sample_id):
     raise SampleNotFoundException(f"Sample with id {sample_id} not found")
 
 
-@mod_sample.route('/delete/<sample_id>/additional/<additional_id>', methods=['GET', 'POST'])
+@mod_sample.route('/delete/<int:sample_id>/additional/<int:additional_id>', methods=['GET', 'POST'])
 @login_required
 @check_access_rights([Role.admin])
 @template_renderer()
@@ -379,9 +446,9 @@ def delete_sample_additional(sample_id, additional_id):
     :rtype: dict
     """
     from run import config
-    sample = Sample.query.filter(Sample.id == sample_id).first()
+    sample = g.db.get(Sample, sample_id)
     if sample is not None:
-        extra = ExtraFile.query.filter(ExtraFile.id == additional_id).first()
+        extra = g.db.get(ExtraFile, additional_id)
         if extra is not None:
             form = DeleteAdditionalSampleForm(request.form)
             if form.validate_on_submit():
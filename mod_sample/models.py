@@ -60,6 +60,8 @@ class Sample(Base):
     tests = relationship('RegressionTest', back_populates='sample')
     upload = relationship('Upload', uselist=False, back_populates='sample')
     tags = relationship('Tag', secondary=sample_tag_association, back_populates='samples')
+    # The database deletes the issues of a deleted sample
+    issues = relationship('Issue', back_populates='sample', passive_deletes=True)
 
     def __init__(self, sha, extension, original_name) -> None:
         """
@@ -211,7 +213,7 @@ class Issue(Base):
     id = Column(Integer, primary_key=True)
     sample_id = Column(Integer, ForeignKey('sample.id', onupdate="CASCADE",
                                            ondelete="CASCADE"))
-    sample = relationship('Sample', uselist=False)
+    sample = relationship('Sample', uselist=False, back_populates='issues')
     issue_id = Column(Integer, nullable=False)
     title = Column(Text(), nullable=False)
     user = Column(Text(), nullable=False)
@@ -30,6 +30,9 @@ from mod_upload.models import (FTPCredentials, Platform, QueuedSample, Upload,
 
 mod_upload = Blueprint('upload', __name__)
 
+# Samples can be several GB, so hash them in large blocks to keep the number of reads and hash updates low
+HASH_BLOCK_SIZE = 1024 * 1024
+
 
 @mod_upload.before_app_request
 def before_app_request() -> None:
@@ -422,7 +425,7 @@ def create_hash_for_sample(file_path) -> str:
     """
     hash_sha256 = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
             hash_sha256.update(chunk)
 
     return hash_sha256.hexdigest()
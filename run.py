@@ -32,6 +32,7 @@ from mod_regression.controllers import mod_regression
 from mod_sample.controllers import mod_sample
 from mod_test.controllers import mod_test
 from mod_upload.controllers import mod_upload
+from utility import cache
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app)
@@ -53,6 +54,12 @@ except KeyError:
     traceback.print_exc()
     raise IncompleteConfigException()
 
+# Init cache. By default, it's stored on disk, so that it's shared between the gunicorn workers
+app.config.setdefault('CACHE_TYPE', 'FileSystemCache')
+# The cached entries are unpickled, so keep them in the installation instead of a folder every user can write to
+app.config.setdefault('CACHE_DIR', os.path.join(app.root_path, 'cache'))
+cache.init_app(app)
+
 # Init logger
 log_configuration = LogConfiguration(app.root_path,
                                      'platform',
@@ -7,6 +7,8 @@ from unittest import mock
 
 from flask import g
 from flask_testing import TestCase
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from werkzeug.datastructures import Headers
 
 from database import create_session
@@ -20,6 +22,7 @@ from mod_sample.models import ForbiddenExtension, ForbiddenMimeType, Sample
 from mod_test.models import (Fork, Test, TestPlatform, TestProgress,
                              TestResult, TestResultFile, TestStatus, TestType)
 from mod_upload.models import Platform, Upload
+from utility import cache
 
 
 @contextmanager
@@ -35,6 +38,41 @@ def provide_file_at_root(file_name, to_write=None, to_delete=True):
         os.remove(file_name)
 
 
+@contextmanager
+def forbid_lazy_loads():
+    """Fail on any lazy load of a relationship that needs a query, in any session."""
+    def check_lazy_load(orm_execute_state):
+        if orm_execute_state.lazy_loaded_from is not None:
+            raise AssertionError(f'Lazy load of {orm_execute_state.lazy_loaded_from.class_.__name__} relationship: '
+                                 f'{orm_execute_state.statement}')
+
+    event.listen(Session, 'do_orm_execute', check_lazy_load)
+    try:
+        yield
+    finally:
+        event.remove(Session, 'do_orm_execute', check_lazy_load)
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Collect the SQL statements sent to the database while the context is active.
+
+    :param engine: engine to listen on
+    :type engine: sqlalchemy.engine.Engine
+    """
+    statements = []
+
+    def collect_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', collect_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', collect_statement)
+
+
 def load_file_lines(filepath):
     """
     Load lines of the file passed.
@@ -119,6 +157,7 @@ def load_config(file):
         'PROJECT_NAME': "test_zone",
         'GCS_SIGNED_URL_EXPIRY_LIMIT': 720,
         'INSTALL_FOLDER': ROOT_DIR,
+        'CACHE_TYPE': 'SimpleCache',
     }
 
 
@@ -192,6 +231,7 @@ class BaseTestCase(TestCase):
 
     def setUp(self):
         """Set up all entities."""
+        cache.clear()
         self.app.preprocess_request()
         g.db = create_session(
             self.app.config['DATABASE_URI'], drop_tables=True)
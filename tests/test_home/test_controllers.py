@@ -1,4 +1,8 @@
+from flask import g
+
 from mod_auth.models import Role
+from mod_home.controllers import clear_index_cache
+from mod_home.models import GeneralData
 from tests.base import BaseTestCase
 
 
@@ -30,3 +34,17 @@ class TestControllers(BaseTestCase):
             self.assertEqual(response.status_code, 200)
             self.assert_context('test_access', True)
             self.assert_template_used('home/index.html')
+
+    def test_root_is_cached(self):
+        """Test that the home page is served from cache until the cache is cleared."""
+        self.app.test_client().get('/')
+        last_commit = GeneralData.query.filter(GeneralData.key == 'last_commit').first()
+        last_commit.value = 'abcdef0123456789'
+        g.db.commit()
+
+        response = self.app.test_client().get('/')
+        self.assertNotIn(b'abcdef0123456789', response.data)
+
+        clear_index_cache()
+        response = self.app.test_client().get('/')
+        self.assertIn(b'abcdef0123456789', response.data)
@@ -11,7 +11,7 @@ from mod_regression.models import (Category, InputType, OutputType,
                                    RegressionTestOutputFiles)
 from mod_sample.models import Sample
 from mod_test.models import Test, TestResultFile
-from tests.base import BaseTestCase
+from tests.base import BaseTestCase, count_queries, forbid_lazy_loads
 from tests.test_auth.test_controllers import MockUser
 
 
@@ -24,6 +24,122 @@ class TestControllers(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assert_template_used('regression/index.html')
 
+    def test_views_dont_lazy_load(self):
+        """Check the regression views load the relationships they show up front."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            with forbid_lazy_loads():
+                for url in ['/regression/', '/regression/test/2/view', '/regression/sample/1',
+                            '/regression/test/2/output/new', '/regression/test/2/output/remove']:
+                    response = c.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_views_query_count_independent_of_rows(self):
+        """Check the regression views don't run more queries when there are more rows to show."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        urls = ['/regression/', '/regression/test/2/view', '/regression/sample/1', '/regression/test/2/output/new',
+                '/regression/test/2/output/remove']
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+
+            def query_counts():
+                counts = {}
+                for url in urls:
+                    with count_queries(g.db.get_bind()) as statements:
+                        c.get(url)
+                    counts[url] = len(statements)
+                return counts
+
+            counts = query_counts()
+            category = Category.query.filter(Category.id == 1).first()
+            for i in range(10):
+                category.regression_tests.append(
+                    RegressionTest(1, f'-test {i}', InputType.file, OutputType.file, 1, 10))
+                output = RegressionTestOutput(2, f'sample_out_{i}', '.srt', '')
+                g.db.add(output)
+                g.db.flush()
+                g.db.add(RegressionTestOutputFiles(f'variant_{i}', output.id))
+            g.db.commit()
+
+            self.assertEqual(query_counts(), counts)
+
+    def test_root_cache_invalidated_on_change(self):
+        """Check the cached index page is dropped when a category changes."""
+        self.app.test_client().get('/regression/')
+        g.db.add(Category("Teletext", "Samples that contain teletext subtitles"))
+        g.db.commit()
+
+        response = self.app.test_client().get('/regression/')
+        self.assertIn(b'Samples that contain teletext subtitles', response.data)
+
+    def test_view_cache_invalidated_on_change(self):
+        """Check the cached regression test page is dropped when one of its outputs changes."""
+        self.app.test_client().get('/regression/test/2/view')
+        output = RegressionTestOutput.query.filter(RegressionTestOutput.regression_id == 2).first()
+        output.correct = 'renamed_out2'
+        g.db.commit()
+
+        response = self.app.test_client().get('/regression/test/2/view')
+        self.assertIn(b'renamed_out2', response.data)
+
+    def test_view_cache_invalidated_on_commit(self):
+        """Check the cached pages are only invalidated once a change is committed, and not after a rollback."""
+        from mod_regression.controllers import get_view_cache_version
+        version = get_view_cache_version()
+
+        g.db.add(Category("Teletext", "Samples that contain teletext subtitles"))
+        g.db.flush()
+        self.assertEqual(get_view_cache_version(), version)
+        g.db.rollback()
+        self.assertEqual(get_view_cache_version(), version)
+
+        g.db.add(Category("Teletext", "Samples that contain teletext subtitles"))
+        g.db.flush()
+        self.assertEqual(get_view_cache_version(), version)
+        g.db.commit()
+        self.assertNotEqual(get_view_cache_version(), version)
+
+    def test_root_etag(self):
+        """Check the index page can be revalidated with its ETag until the data changes."""
+        response = self.app.test_client().get('/regression/')
+        etag = response.headers['ETag']
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertNotIn('max-age', response.headers['Cache-Control'])
+
+        response = self.app.test_client().get('/regression/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        g.db.add(Category("Teletext", "Samples that contain teletext subtitles"))
+        g.db.commit()
+        response = self.app.test_client().get('/regression/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_root_etag_matches_cached_version(self):
+        """Check the ETag of the index page is made from the version its body was cached under."""
+        import hashlib
+        with mock.patch('mod_regression.controllers.get_view_cache_version', side_effect=['old', 'new']):
+            response = self.app.test_client().get('/regression/')
+
+        etag = f"regression/old/anonymous/regression//{self.app.config['BUILD_COMMIT']}"
+        self.assertEqual(response.headers['ETag'], f'"{hashlib.sha256(etag.encode()).hexdigest()}"')
+
+    def test_root_etag_after_redirect(self):
+        """Check the index page is revalidated when a change redirects back to it."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            etag = c.get('/regression/').headers['ETag']
+            response = c.post('/regression/category_add', headers={'If-None-Match': etag}, follow_redirects=True,
+                              data=dict(category_name="Lost", category_description="And found", submit=True))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn(b'And found', response.data)
+
     def test_specific_regression_test_loads(self):
         """Check specific regression test loading."""
         response = self.app.test_client().get('/regression/test/1/view')
@@ -32,72 +148,88 @@ class TestControllers(BaseTestCase):
         regression_test = RegressionTest.query.filter(RegressionTest.id == 1).first()
         self.assertIn(regression_test.command, str(response.data))
 
-    def test_regression_test_status_toggle(self):
-        """Check status toggling."""
+    def test_regression_test_status_update(self):
+        """Check setting the active status."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
 
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
 
-            regression_test = RegressionTest.query.filter(RegressionTest.id == 1).first()
-            response = c.get('/regression/test/1/toggle')
-            self.assertEqual(response.status_code, 200)
-            self.assertEqual('success', response.json['status'])
-            if regression_test.active == 1:
+            for _ in range(2):
+                response = c.put('/regression/test/1/active', json={'active': False})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual('success', response.json['status'])
                 self.assertEqual('False', response.json['active'])
-            else:
-                self.assertEqual('True', response.json['active'])
+                updated_test = RegressionTest.query.filter(RegressionTest.id == 1).first()
+                self.assertFalse(updated_test.active)
+
+            response = c.put('/regression/test/1/active', json={'active': True})
+            self.assertEqual('True', response.json['active'])
+            updated_test = RegressionTest.query.filter(RegressionTest.id == 1).first()
+            self.assertTrue(updated_test.active)
+
+    def test_regression_test_status_update_invalid(self):
+        """Check setting the active status requires a boolean."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
 
-    @mock.patch('mod_regression.controllers.RegressionTestOutput')
+            response = c.put('/regression/test/1/active', json={'active': 'yes'})
+            self.assertEqual(response.status_code, 400)
+            response = c.put('/regression/test/1/active')
+            self.assertEqual(response.status_code, 400)
+
+    @mock.patch('mod_regression.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_result_file_not_found(self, mock_g, mock_regression_output):
+    def test_download_result_file_not_found(self, mock_g, mock_regression_g):
         """Test that non-existent result file gives 404."""
         from mod_regression.controllers import test_result_file
-        mock_regression_output.query.filter.return_value.first.return_value = None
+        mock_regression_g.db.get.return_value = None
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(NotFound):
             test_result_file(1)
 
-        mock_regression_output.query.filter.assert_called_once_with(mock_regression_output.id == 1)
+        mock_regression_g.db.get.assert_called_once_with(RegressionTestOutput, 1)
 
-    @mock.patch('mod_regression.controllers.RegressionTestOutputFiles')
+    @mock.patch('mod_regression.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_result_file_not_found_variant(self, mock_g, mock_regression_output_file):
+    def test_download_result_file_not_found_variant(self, mock_g, mock_regression_g):
         """Test that non-existent result file gives 404."""
         from mod_regression.controllers import multiple_test_result_file
-        mock_regression_output_file.query.filter.return_value.first.return_value = None
+        mock_regression_g.db.get.return_value = None
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(NotFound):
             multiple_test_result_file(1)
 
-        mock_regression_output_file.query.filter.assert_called_once_with(mock_regression_output_file.id == 1)
+        mock_regression_g.db.get.assert_called_once_with(RegressionTestOutputFiles, 1)
 
     @mock.patch('mod_regression.controllers.serve_file_download')
-    @mock.patch('mod_regression.controllers.RegressionTestOutput')
+    @mock.patch('mod_regression.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_result_file(self, mock_g, mock_regression_output, mock_serve):
+    def test_download_result_file(self, mock_g, mock_regression_g, mock_serve):
         """Test that correct result file triggers serve download."""
         from mod_regression.controllers import test_result_file
 
         mock_g.user = MockUser(id=1, role="None")
         response = test_result_file(1)
 
-        mock_regression_output.query.filter.assert_called_once_with(mock_regression_output.id == 1)
+        mock_regression_g.db.get.assert_called_once_with(RegressionTestOutput, 1)
         mock_serve.assert_called_once()
 
     @mock.patch('mod_regression.controllers.serve_file_download')
-    @mock.patch('mod_regression.controllers.RegressionTestOutputFiles')
+    @mock.patch('mod_regression.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_result_file_variant(self, mock_g, mock_regression_output_file, mock_serve):
+    def test_download_result_file_variant(self, mock_g, mock_regression_g, mock_serve):
         """Test that correct result file triggers serve download for variants."""
         from mod_regression.controllers import multiple_test_result_file
 
         mock_g.user = MockUser(id=1, role="None")
         response = multiple_test_result_file(1)
 
-        mock_regression_output_file.query.filter.assert_called_once_with(mock_regression_output_file.id == 1)
+        mock_regression_g.db.get.assert_called_once_with(RegressionTestOutputFiles, 1)
         mock_serve.assert_called_once()
 
     def test_regression_test_deletion_Without_login(self):
@@ -137,6 +269,9 @@ class TestControllers(BaseTestCase):
             self.assertEqual(response.status_code, 302)
             self.assertEqual(RegressionTest.query.filter(RegressionTest.id == 1).first(), None)
             self.assertEqual(CustomizedTest.query.filter(CustomizedTest.regression_id == 1).first(), None)
+            self.assertEqual(TestResultFile.query.filter(TestResultFile.regression_test_id == 1).first(), None)
+            self.assertEqual(Category.query.filter(Category.id == 1).first().regression_tests, [])
+            self.assertIsNone(RegressionTestOutput.query.filter(RegressionTestOutput.id == 1).first().regression_id)
 
     def test_add_category(self):
         """Check it will add a category."""
@@ -148,6 +283,12 @@ class TestControllers(BaseTestCase):
                    data=dict(category_name="Lost", category_description="And found", submit=True))
             self.assertNotEqual(Category.query.filter(Category.name == "Lost").first(), None)
 
+    def test_category_bulk_add(self):
+        """Check it will add several categories at once."""
+        from mod_regression.controllers import category_bulk_add
+        category_bulk_add([("Lost", "And found"), ("Found", "And lost")])
+        self.assertEqual(Category.query.filter(Category.name.in_(["Lost", "Found"])).count(), 2)
+
     def test_add_category_empty(self):
         """Check it won't add a category with an empty name."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
@@ -229,6 +370,20 @@ class TestControllers(BaseTestCase):
             ))
             self.assertNotEqual(RegressionTest.query.filter(RegressionTest.id == 3).first(), None)
 
+    def test_add_test_choices_refreshed_on_new_category(self):
+        """Check the category choices of the add form include a newly added category."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            c.get('/regression/test/new')
+            c.post('/regression/category_add',
+                   data=dict(category_name="Lost", category_description="And found", submit=True))
+            response = c.get('/regression/test/new')
+            self.assertIn(b'Lost', response.data)
+            category_names = [name for _, name in self.get_context_variable('form').category_id.choices]
+            self.assertEqual(category_names, sorted(category_names))
+
     def test_add_test_empty_erc(self):
         """Check it will not add a regression test with empty Expected Runtime Code."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
@@ -312,6 +467,30 @@ class TestControllers(BaseTestCase):
             else:
                 self.fail("No tests in category")
 
+    def test_edit_test_unchanged(self):
+        """Check it won't touch a regression test when nothing was changed."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            with mock.patch('mod_regression.controllers.invalidate_view_cache') as mock_invalidate:
+                response = c.post('/regression/test/2/edit', data=dict(
+                    sample_id=2,
+                    command="-autoprogram -out=ttxt -latin1 -ucla",
+                    input_type="file",
+                    output_type="file",
+                    category_id=3,
+                    expected_rc=10,
+                    submit=True,
+                ))
+            self.assertEqual(response.status_code, 302)
+            mock_invalidate.assert_not_called()
+
+            response = c.get(response.location)
+            self.assertIn(b'No changes were made to the regression test', response.data)
+            with c.session_transaction() as session:
+                self.assertNotIn('_flashes', session)
+
     def test_edit_test_empty_erc(self):
         """Check it will not edit a regression test with empty Expected Runtime Code."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
@@ -380,27 +559,85 @@ class TestControllers(BaseTestCase):
             else:
                 self.fail("No tests in category")
 
+    def test_edit_test_without_category(self):
+        """Check it will add a regression test without a category to the chosen one."""
+        from mod_regression.models import regressionTestLinkTable
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        g.db.execute(regressionTestLinkTable.delete().where(regressionTestLinkTable.c.regression_id == 2))
+        g.db.commit()
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            response = c.post('/regression/test/2/edit', data=dict(
+                sample_id=2,
+                command="-autoprogram -out=ttxt -latin1 -ucla",
+                input_type="file",
+                output_type="file",
+                category_id=2,
+                expected_rc=10,
+                submit=True,
+            ))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual([category.id for category in RegressionTest.query.get(2).categories], [2])
+
+    def test_edit_test_to_linked_category(self):
+        """Check it will move a regression test to a category it already belongs to as well."""
+        from mod_regression.models import regressionTestLinkTable
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        g.db.execute(regressionTestLinkTable.insert().values(regression_id=2, category_id=5))
+        g.db.commit()
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            response = c.post('/regression/test/2/edit', data=dict(
+                sample_id=2,
+                command="-demogorgans",
+                input_type="file",
+                output_type="file",
+                category_id=5,
+                expected_rc=10,
+                submit=True,
+            ))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual([category.id for category in RegressionTest.query.get(2).categories], [5])
+
     def test_if_test_regression_view_throws_a_not_found_error(self):
         """Check if the test doesn't exist and will throw an error 404."""
         response = self.app.test_client().get('regression/test/1337/view')
         self.assertEqual(response.status_code, 404)
 
-    def test_if_test_toggle_view_throws_a_not_found_error(self):
-        """Check if the test toggle doesn't exist and will throw an error 404."""
+    def test_if_test_status_update_throws_a_not_found_error(self):
+        """Check if the status update of a test that doesn't exist will throw an error 404."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
 
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
 
-            response = c.get('regression/test/1337/toggle')
+            response = c.put('regression/test/1337/active', json={'active': True})
             self.assertEqual(response.status_code, 404)
 
+    def test_status_update_non_numeric_id(self):
+        """Check the status update of a test with a non-numeric id is rejected by the routing with a 404."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+
+            with count_queries(g.db.get_bind()) as statements:
+                response = c.put('/regression/test/abc/active', json={'active': True})
+            self.assertEqual(response.status_code, 404)
+            self.assertFalse([statement for statement in statements if statement.startswith('UPDATE')])
+
     def test_sample_view(self):
         """Test if it'll return a valid sample."""
         response = self.app.test_client().get('/regression/sample/1')
         sample = Sample.query.filter(Sample.id == 1).first()
         self.assertEqual(response.status_code, 200)
         self.assert_context('sample', sample)
+        tests = RegressionTest.query.filter(RegressionTest.sample_id == 1).all()
+        self.assertEqual([test.id for test in self.get_context_variable('tests')], [test.id for test in tests])
 
     def test_sample_view_nonexistent(self):
         """Test if it'll return a valid sample."""
@@ -414,7 +651,7 @@ class TestControllers(BaseTestCase):
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
             c.post('/regression/test/2/output/new',
-                   data=dict(output_file=2, test_id="Test id 2 with output out2", submit=True))
+                   data=dict(output_file=2, test_id="out2", submit=True))
             self.assertNotEqual(
                 RegressionTestOutputFiles.query.filter(
                     and_(
@@ -425,6 +662,38 @@ class TestControllers(BaseTestCase):
                 None
             )
 
+    def test_add_output_skips_known_variants(self):
+        """Check it won't offer a result that is already a variant of the output."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            c.get('/regression/test/2/output/new')
+            self.assertEqual(
+                self.get_context_variable('form').test_id.choices, [("out2", "Test id 2 with output out2")])
+
+            g.db.add(RegressionTestOutputFiles("out2", 2))
+            g.db.commit()
+            c.get('/regression/test/2/output/new')
+            self.assertEqual(self.get_context_variable('form').test_id.choices, [])
+
+    def test_add_output_only_recent_results(self):
+        """Check it only offers the results of the 50 most recent test runs, keeping the latest run of each output."""
+        from mod_test.models import TestPlatform, TestType
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        tests = [Test(TestPlatform.linux, TestType.commit, 1, 'master', 'abcdefgh') for _ in range(50)]
+        g.db.add_all(tests)
+        g.db.commit()
+        g.db.add_all([TestResultFile(test.id, 2, 2, "sample_out2", "recent") for test in tests])
+        g.db.commit()
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            c.get('/regression/test/2/output/new')
+
+        self.assertEqual(self.get_context_variable('form').test_id.choices,
+                         [("recent", f"Test id {tests[-1].id} with output recent")])
+
     def test_add_output_wrong_regression_test(self):
         """Check it will throw 404 for a regression_test which does't exist."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
@@ -433,7 +702,7 @@ class TestControllers(BaseTestCase):
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
             response = c.post(
                 '/regression/test/69420/output/new',
-                data=dict(output_file=2, test_id="Test id 2 with output out2", submit=True)
+                data=dict(output_file=2, test_id="out2", submit=True)
             )
             self.assertEqual(response.status_code, 404)
 
@@ -468,6 +737,20 @@ class TestControllers(BaseTestCase):
                 None
             )
 
+    def test_remove_output_of_other_regression_test(self):
+        """Check it won't remove an output of a different regression test."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        rtof = RegressionTestOutputFiles.query.filter(RegressionTestOutputFiles.file_hashes == "bluedabadee").first()
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            response = c.post(
+                '/regression/test/1/output/remove',
+                data=dict(output_file=rtof.id, submit=True)
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(
+                RegressionTestOutputFiles.query.filter(RegressionTestOutputFiles.id == rtof.id).first(), None)
+
     def test_remove_output_wrong_regression_test(self):
         """Check it will throw 404 for a regression_test which doesn't exist."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
@@ -510,7 +793,7 @@ class TestControllers(BaseTestCase):
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
             c.post('/regression/test/2/output/new',
-                   data=dict(test_id="Test id 2 with output demogorgans", submit=True))
+                   data=dict(test_id="demogorgans", submit=True))
             self.assertEqual(
                 RegressionTestOutputFiles.query.filter(
                     and_(
@@ -527,7 +810,7 @@ class TestControllers(BaseTestCase):
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
             c.post('/regression/test/2/output/new',
-                   data=dict(output_file=69420, test_id="Test id 2 with output out2", submit=True))
+                   data=dict(output_file=69420, test_id="out2", submit=True))
             self.assertEqual(
                 RegressionTestOutputFiles.query.filter(
                     and_(
@@ -559,7 +842,7 @@ class TestControllers(BaseTestCase):
         with self.app.test_client() as c:
             c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
             c.post('/regression/test/3/output/new',
-                   data=dict(output_file=3, test_id="Test id 2 with output out3", submit=True))
+                   data=dict(output_file=3, test_id="out3", submit=True))
             self.assertEqual(
                 RegressionTestOutputFiles.query.filter(
                     RegressionTestOutputFiles.file_hashes == "out3"
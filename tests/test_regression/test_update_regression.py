@@ -1,7 +1,9 @@
 import os
 from unittest import mock
 
-from tests.base import BaseTestCase
+from flask import g
+
+from tests.base import BaseTestCase, forbid_lazy_loads
 
 
 class TestUpdateRegression(BaseTestCase):
@@ -24,7 +26,7 @@ class TestUpdateRegression(BaseTestCase):
         from mod_regression.update_regression import update_expected_results
 
         mock_os.path.isfile.return_value = True
-        mock_session.return_value.query.return_value.all.return_value = []
+        mock_session.return_value.query.return_value.options.return_value.all.return_value = []
         expected = True
 
         response = update_expected_results('valid/path')
@@ -38,6 +40,7 @@ class TestUpdateRegression(BaseTestCase):
         from mod_regression.update_regression import update_expected_results
 
         mock_os.path.isfile.return_value = True
+        mock_os.cpu_count.return_value = 2
         expected = True
         num_tests = 2   # store number of mock regression tests we have
 
@@ -50,6 +53,54 @@ class TestUpdateRegression(BaseTestCase):
         mock_os.makedirs.assert_called_once()
         self.assertEqual(mock_test.run_ccex.call_count, num_tests)
 
+    @mock.patch('mod_regression.update_regression.os.makedirs')
+    @mock.patch('mod_regression.update_regression.os.path.isfile', return_value=True)
+    @mock.patch('mod_regression.update_regression.Test.run_ccex')
+    def test_update_expected_results_no_lazy_loads(self, mock_run_ccex, mock_isfile, mock_makedirs):
+        """Test that the samples and outputs of all regression tests are loaded up front."""
+        from mod_regression.update_regression import update_expected_results
+
+        with forbid_lazy_loads():
+            response = update_expected_results('valid/path')
+
+        self.assertTrue(response)
+        self.assertEqual(mock_run_ccex.call_count, 2)
+
+    @mock.patch('mod_regression.update_regression.ThreadPoolExecutor')
+    @mock.patch('mod_regression.update_regression.os.makedirs')
+    @mock.patch('mod_regression.update_regression.os.path.isfile', return_value=True)
+    def test_update_expected_results_jobs(self, mock_isfile, mock_makedirs, mock_executor):
+        """Test that the number of parallel ccextractor runs can be chosen."""
+        from mod_regression.update_regression import update_expected_results
+
+        response = update_expected_results('valid/path', jobs=3)
+
+        self.assertTrue(response)
+        mock_executor.assert_called_once_with(max_workers=3)
+        mock_executor.return_value.__enter__.return_value.map.assert_called_once()
+
+    @mock.patch('mod_regression.update_regression.os.makedirs')
+    @mock.patch('mod_regression.update_regression.os.path.isfile', return_value=True)
+    @mock.patch('mod_regression.update_regression.Test.run_ccex')
+    def test_update_expected_results_shared_sample(self, mock_run_ccex, mock_isfile, mock_makedirs):
+        """Test that regression tests on the same sample don't write to the same log file."""
+        from mod_regression.models import (InputType, OutputType,
+                                           RegressionTest,
+                                           RegressionTestOutput)
+        from mod_regression.update_regression import update_expected_results
+        regression_test = RegressionTest(1, "-autoprogram -out=srt", InputType.file, OutputType.file, 3, 10)
+        g.db.add(regression_test)
+        g.db.commit()
+        g.db.add(RegressionTestOutput(regression_test.id, "sample_out3", ".srt", ""))
+        g.db.commit()
+
+        response = update_expected_results('valid/path')
+
+        self.assertTrue(response)
+        runs = [call.args for call in mock_run_ccex.call_args_list if call.args[2].endswith('sample1.ts')]
+        self.assertEqual(len(runs), 2)
+        self.assertNotEqual(runs[0][1], runs[1][1])
+
     def test_Test_initiation(self):
         """Test initiation of Test class with mock arguments."""
         from mod_regression.update_regression import Test
@@ -57,16 +108,19 @@ class TestUpdateRegression(BaseTestCase):
         filename = 'some.txt'
         args = '--autotext'
         output = 'someout.txt'
+        test_id = 1
 
         test = Test(
             filename,
             args,
-            output
+            output,
+            test_id
         )
 
         self.assertEqual(test.input, filename)
         self.assertEqual(test.args, args)
         self.assertEqual(test.output, output)
+        self.assertEqual(test.test_id, test_id)
 
     def test_Test_get_inputfilepath(self):
         """Test method get_inputfilepath of Test class."""
@@ -122,6 +176,12 @@ class TestUpdateRegression(BaseTestCase):
         )
 
         self.assertEqual(result, True)
+        mock_open.assert_called_once_with(log_file, 'wb')
+        mock_subprocess.run.assert_called_once_with(
+            [path_to_ccex, args, input_file, '-o', output_file],
+            stdout=mock_open.return_value.__enter__.return_value,
+            stderr=mock_subprocess.STDOUT
+        )
 
     @mock.patch('mod_regression.update_regression.subprocess')
     @mock.patch('mod_regression.update_regression.open')
@@ -7,7 +7,7 @@ from mod_auth.models import Role
 from mod_home.models import CCExtractorVersion
 from mod_sample.media_info_parser import InvalidMediaInfoError
 from mod_sample.models import Sample, Tag
-from tests.base import BaseTestCase
+from tests.base import BaseTestCase, count_queries, forbid_lazy_loads
 from tests.test_auth.test_controllers import MockUser
 
 
@@ -55,6 +55,72 @@ class TestControllers(BaseTestCase):
         self.assertIn('Repository: Pass', str(response.data))
         self.assertIn('Last release: Fail', str(response.data))
 
+    @mock.patch('mod_sample.media_info_parser.MediaInfoFetcher')
+    def test_sample_fail_exit_code(self, mock_media):
+        """Test that a sample fails when its exit code differs from the expected one."""
+        version = CCExtractorVersion('1.3', '2015-02-27T19:35:32Z', 'abcdefgh')
+        g.db.add(version)
+        g.db.commit()
+        response = self.app.test_client().get('/sample/sample1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Repository: Pass', str(response.data))
+        self.assertIn('Last release: Fail', str(response.data))
+
+    @mock.patch('mod_sample.media_info_parser.MediaInfoFetcher')
+    def test_sample_info_no_lazy_loads(self, mock_media):
+        """Test that the sample info page loads everything it shows together with the sample."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            with forbid_lazy_loads():
+                response = c.get('/sample/1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assert_template_used('sample/sample_info.html')
+
+    def test_get_latest_tests(self):
+        """Test that the test runs of the latest commit and release are fetched with a single statement."""
+        from mod_sample.controllers import get_latest_tests
+
+        g.db.add(CCExtractorVersion('1.3', '2015-02-27T19:35:32Z', 'abcdefgh'))
+        g.db.commit()
+        with count_queries(g.db.get_bind()) as statements:
+            test_commit, test_release = get_latest_tests()
+
+        self.assertEqual(test_commit.id, 1)
+        self.assertEqual(test_release.id, 2)
+        self.assertEqual(len(statements), 1)
+
+    def test_get_latest_tests_cached(self):
+        """Test that the latest test runs are cached until the cache is cleared."""
+        from mod_sample.controllers import (clear_latest_tests_cache,
+                                            get_latest_tests)
+
+        self.assertEqual(get_latest_tests()[1].id, 1)
+        g.db.add(CCExtractorVersion('1.3', '2015-02-27T19:35:32Z', 'abcdefgh'))
+        g.db.commit()
+        with count_queries(g.db.get_bind()) as statements:
+            test_commit, test_release = get_latest_tests()
+
+        self.assertEqual(test_commit.id, 1)
+        self.assertEqual(test_release.id, 1)
+        self.assertNotIn('general_data', statements[0])
+
+        clear_latest_tests_cache()
+        self.assertEqual(get_latest_tests()[1].id, 2)
+
+    def test_get_test_statuses(self):
+        """Test that the statuses of several test runs are checked with a single statement."""
+        from mod_sample.controllers import get_test_statuses
+        from mod_test.models import Test
+
+        tests = [g.db.get(Test, 1), None, g.db.get(Test, 2)]
+        with count_queries(g.db.get_bind()) as statements:
+            statuses = get_test_statuses(tests, [2])
+
+        self.assertEqual(statuses, ['Pass', 'Unknown', 'Fail'])
+        self.assertEqual(len(statements), 1)
+
     @mock.patch('mod_sample.media_info_parser.MediaInfoFetcher')
     def test_sample_create_xml(self, mock_media):
         """Test sample loading."""
@@ -75,9 +141,9 @@ class TestControllers(BaseTestCase):
         self.assert_template_used('sample/sample_info.html')
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample(self, mock_g, mock_sample, mock_serve_download):
+    def test_download_sample(self, mock_g, mock_sample_g, mock_serve_download):
         """Test function download_sample."""
         from mod_sample.controllers import download_sample
 
@@ -85,30 +151,30 @@ class TestControllers(BaseTestCase):
         response = download_sample(1)
 
         self.assertEqual(response, mock_serve_download())
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_raise_exception(self, mock_g, mock_sample, mock_serve_download):
+    def test_download_sample_raise_exception(self, mock_g, mock_sample_g, mock_serve_download):
         """Test function download_sample to raise SampleNotFoundException."""
         from mod_sample.controllers import (SampleNotFoundException,
                                             download_sample)
 
-        mock_sample.query.filter.return_value.first.return_value = None
+        mock_sample_g.db.get.return_value = None
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(SampleNotFoundException):
             download_sample(1)
 
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
         mock_serve_download.assert_not_called()
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_sample.controllers.os')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_media_info(self, mock_g, mock_os, mock_sample, mock_serve_download):
+    def test_download_sample_media_info(self, mock_g, mock_os, mock_sample_g, mock_serve_download):
         """Test function download_sample_media_info."""
         from mod_sample.controllers import download_sample_media_info
 
@@ -116,14 +182,14 @@ class TestControllers(BaseTestCase):
         response = download_sample_media_info(1)
 
         self.assertEqual(response, mock_serve_download())
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
         mock_os.path.isfile.assert_called_once()
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_sample.controllers.os')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_media_info_path_wrong(self, mock_g, mock_os, mock_sample, mock_serve_download):
+    def test_download_sample_media_info_path_wrong(self, mock_g, mock_os, mock_sample_g, mock_serve_download):
         """Test function download_sample_media_info with wrong path for media info."""
         from mod_sample.controllers import (SampleNotFoundException,
                                             download_sample_media_info)
@@ -134,78 +200,76 @@ class TestControllers(BaseTestCase):
         with self.assertRaises(SampleNotFoundException):
             download_sample_media_info(1)
 
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
         mock_os.path.isfile.assert_called_once()
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_sample.controllers.os')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_media_info_sample_not_found(self, mock_g, mock_os, mock_sample, mock_serve_download):
+    def test_download_sample_media_info_sample_not_found(self, mock_g, mock_os, mock_sample_g, mock_serve_download):
         """Test function download_sample_media_info to raise SampleNotFoundException."""
         from mod_sample.controllers import (SampleNotFoundException,
                                             download_sample_media_info)
 
-        mock_sample.query.filter.return_value.first.return_value = None
+        mock_sample_g.db.get.return_value = None
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(SampleNotFoundException):
             download_sample_media_info(1)
 
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
         mock_os.path.isfile.assert_not_called()
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
-    @mock.patch('mod_sample.controllers.ExtraFile')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_additional(self, mock_g, mock_extra, mock_sample, mock_serve_download):
+    def test_download_sample_additional(self, mock_g, mock_sample_g, mock_serve_download):
         """Test function download_sample_additional."""
         from mod_sample.controllers import download_sample_additional
+        from mod_sample.models import ExtraFile
 
         mock_g.user = MockUser(id=1, role="None")
 
         response = download_sample_additional(1, 1)
 
         self.assertEqual(response, mock_serve_download())
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
-        mock_extra.query.filter.assert_called_once_with(mock_extra.id == 1)
+        self.assertEqual(mock_sample_g.db.get.call_args_list, [mock.call(Sample, 1), mock.call(ExtraFile, 1)])
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
-    @mock.patch('mod_sample.controllers.ExtraFile')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_additional_sample_not_found(self, mock_g, mock_extra, mock_sample, mock_serve_download):
+    def test_download_sample_additional_sample_not_found(self, mock_g, mock_sample_g, mock_serve_download):
         """Test function download_sample_additional to raise SampleNotFoundException."""
         from mod_sample.controllers import (SampleNotFoundException,
                                             download_sample_additional)
 
-        mock_sample.query.filter.return_value.first.return_value = None
+        mock_sample_g.db.get.return_value = None
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(SampleNotFoundException):
             download_sample_additional(1, 1)
 
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
-        mock_extra.query.filter.assert_not_called()
+        mock_sample_g.db.get.assert_called_once_with(Sample, 1)
+        mock_serve_download.assert_not_called()
 
     @mock.patch('mod_sample.controllers.serve_file_download')
-    @mock.patch('mod_sample.controllers.Sample')
-    @mock.patch('mod_sample.controllers.ExtraFile')
+    @mock.patch('mod_sample.controllers.g')
     @mock.patch('mod_auth.controllers.g')
-    def test_download_sample_additional_extrafile_not_found(self, mock_g, mock_extra, mock_sample, mock_serve_download):
+    def test_download_sample_additional_extrafile_not_found(self, mock_g, mock_sample_g, mock_serve_download):
         """Test function download_sample_additional to raise SampleNotFoundException when extra file not found."""
         from mod_sample.controllers import (SampleNotFoundException,
                                             download_sample_additional)
+        from mod_sample.models import ExtraFile
 
-        mock_extra.query.filter.return_value.first.return_value = None
+        mock_sample_g.db.get.side_effect = [mock.MagicMock(), None]
         mock_g.user = MockUser(id=1, role="None")
 
         with self.assertRaises(SampleNotFoundException):
             download_sample_additional(1, 1)
 
-        mock_sample.query.filter.assert_called_once_with(mock_sample.id == 1)
-        mock_extra.query.filter.assert_called_once_with(mock_extra.id == 1)
+        self.assertEqual(mock_sample_g.db.get.call_args_list, [mock.call(Sample, 1), mock.call(ExtraFile, 1)])
+        mock_serve_download.assert_not_called()
 
     def test_edit_sample(self):
         """Check if it will edit a sample."""
@@ -229,6 +293,56 @@ class TestControllers(BaseTestCase):
             self.assertIn("Editing sample with id 1", str(response.data))
             self.assertEqual(response.status_code, 200)
 
+    def test_edit_sample_get_request_no_lazy_loads(self):
+        """Check that the edit sample form loads the upload and tags together with the sample."""
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            with forbid_lazy_loads():
+                response = c.get('/sample/edit/1')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.get_context_variable('form').version.data, 1)
+
+    @mock.patch('mod_sample.controllers.remove_files')
+    def test_delete_sample(self, mock_remove_files):
+        """Check that a deleted sample has its files removed after the row is gone."""
+        import os
+
+        from mod_sample.models import ExtraFile
+        from run import config
+        self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
+        g.db.add(ExtraFile(1, 'srt', 'extra.srt'))
+        g.db.commit()
+        basedir = os.path.join(config.get('SAMPLE_REPOSITORY', ''), 'TestFiles')
+
+        with self.app.test_client() as c:
+            c.post('/account/login', data=self.create_login_form_data(self.user.email, self.user.password))
+            response = c.post('/sample/delete/1', data=dict(submit=True))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNone(Sample.query.filter(Sample.id == 1).first())
+        mock_remove_files.assert_called_once_with([
+            os.path.join(basedir, 'media', 'sample1.xml'),
+            os.path.join(basedir, 'sample1.ts'),
+            os.path.join(basedir, 'extra', 'sample1_1.srt'),
+        ])
+
+    def test_remove_files_already_removed(self):
+        """Check that files which are already gone are skipped when removing the files of a sample."""
+        import os
+        import tempfile
+
+        from mod_sample.controllers import remove_files
+
+        with tempfile.TemporaryDirectory() as folder:
+            existing = os.path.join(folder, 'existing')
+            open(existing, 'w').close()
+
+            remove_files([existing, os.path.join(folder, 'missing')])
+
+            self.assertFalse(os.path.exists(existing))
+
     def test_add_tag(self):
         """Check add tags api endpoint."""
         self.create_user_with_role(self.user.name, self.user.email, self.user.password, Role.admin)
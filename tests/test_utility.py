@@ -18,6 +18,36 @@ class TestUtility(BaseTestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(1, mock_path.join.call_count)
 
+    @mock.patch('run.storage_client_bucket')
+    def test_serve_file_download_sets_file_name_in_url(self, mock_bucket):
+        """Test that serve_file_download names the download through the signed URL."""
+        from utility import serve_file_download
+
+        mock_blob = mock_bucket.blob.return_value
+        mock_blob.generate_signed_url.return_value = 'https://www.test.com'
+
+        response = serve_file_download('to_download', 'folder')
+
+        self.assertEqual(response.status_code, 302)
+        mock_bucket.blob.assert_called_once_with('folder/to_download')
+        self.assertEqual(mock_blob.generate_signed_url.call_args.kwargs['response_disposition'],
+                         'attachment; filename="to_download"')
+        mock_blob.patch.assert_not_called()
+
+    @mock.patch('run.storage_client_bucket')
+    def test_serve_file_download_sets_content_type_in_url(self, mock_bucket):
+        """Test that serve_file_download sets the type of the download from its extension, when it's known."""
+        from utility import serve_file_download
+
+        mock_blob = mock_bucket.blob.return_value
+        mock_blob.generate_signed_url.return_value = 'https://www.test.com'
+
+        serve_file_download('media.xml', 'TestFiles', 'media')
+        self.assertIn(mock_blob.generate_signed_url.call_args.kwargs['response_type'], ['application/xml', 'text/xml'])
+
+        serve_file_download('sample.unknown_extension', 'TestFiles')
+        self.assertIsNone(mock_blob.generate_signed_url.call_args.kwargs['response_type'])
+
     @mock.patch('utility.cache_has_expired', return_value=True)
     @mock.patch('flask.g.log.critical')
     @mock.patch('requests.get', return_value=MockResponse({}, 200))
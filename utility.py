@@ -2,6 +2,7 @@
 
 import hashlib
 import hmac
+import mimetypes
 from datetime import datetime, timedelta
 from functools import wraps
 from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
@@ -11,9 +12,13 @@ from typing import Callable, List, Union
 import requests
 import werkzeug
 from flask import abort, g, redirect, request
+from flask_caching import Cache
 
 ROOT_DIR = path.dirname(path.abspath(__file__))
 
+# Shared cache, bound to the app in run.py
+cache = Cache()
+
 
 def serve_file_download(file_name, file_folder, file_sub_folder='') -> werkzeug.wrappers.response.Response:
     """
@@ -32,12 +37,13 @@ def serve_file_download(file_name, file_folder, file_sub_folder='') -> werkzeug.
 
     file_path = path.join(file_folder, file_sub_folder, file_name)
     blob = storage_client_bucket.blob(file_path)
-    blob.content_disposition = f'attachment; filename="{file_name}"'
-    blob.patch()
+    # Let the signed URL set the download name and type, instead of updating the metadata of the blob on every download
     url = blob.generate_signed_url(
         version="v4",
         expiration=timedelta(minutes=config.get('GCS_SIGNED_URL_EXPIRY_LIMIT', '')),
         method="GET",
+        response_disposition=f'attachment; filename="{file_name}"',
+        response_type=mimetypes.guess_type(file_name)[0],
     )
     return redirect(url)
 